@@ -0,0 +1,92 @@
+"""Bitboard plumbing shared by ChessBoard and friends.
+
+Squares are numbered 0 to 63 with a1 = 0, b1 = 1, ... h1 = 7, a2 = 8, ... h8 = 63, so a
+square's index is ( rank - 1 ) * 8 + file index.  A bitboard is a plain Python int with bit
+n set if square n is of interest, e. g. every square holding a light Knight."""
+from typing import Iterator, Optional
+
+FILES = 'abcdefgh'
+FILE_INDEX = { file: index for index, file in enumerate( FILES ) } # 'a' -> 0 ... 'h' -> 7
+
+# Every square key, in index order, so that SQUARE_KEYS[0] == 'a1' and SQUARE_KEYS[63] == 'h8'.
+SQUARE_KEYS = tuple( f'{file}{rank}' for rank in range( 1, 9 ) for file in FILES )
+SQUARE_INDEX = { key: index for index, key in enumerate( SQUARE_KEYS ) }
+
+# Colors index the per-color occupancy lists and pick a block of six piece bitboards.
+LIGHT, DARK = 0, 1
+COLORS = ( 'light', 'dark' )
+COLOR_INDEX = { 'light': LIGHT, 'dark': DARK }
+
+def square_index( file: str, rank: int ) -> int:
+    """Translate a file letter and rank number into a square index."""
+    return ( rank - 1 ) * 8 + FILE_INDEX[file]
+
+def iter_bits( bitboard: int ) -> Iterator[int]:
+    """Yield the index of each set bit, least significant first."""
+    while bitboard:
+        lsb = bitboard & -bitboard
+        yield lsb.bit_length() - 1
+        bitboard ^= lsb
+
+def _direction( from_index: int, to_index: int ) -> Optional[tuple[int, int]]:
+    """Return the unit (file_step, rank_step) leading from one square to another along a
+    rank, file, or diagonal, or None if the two squares don't share a line."""
+    file_offset = ( to_index & 7 ) - ( from_index & 7 )
+    rank_offset = ( to_index >> 3 ) - ( from_index >> 3 )
+    if file_offset == 0 and rank_offset == 0:
+        return None
+    if file_offset and rank_offset and abs( file_offset ) != abs( rank_offset ):
+        return None
+    return ( ( file_offset > 0 ) - ( file_offset < 0 ), ( rank_offset > 0 ) - ( rank_offset < 0 ) )
+
+def _between( from_index: int, to_index: int ) -> int:
+    """Bitboard of the squares strictly between two squares sharing a line."""
+    step = _direction( from_index, to_index )
+    if step is None:
+        return 0
+    file, rank = from_index & 7, from_index >> 3
+    squares = 0
+    while True:
+        file += step[0]
+        rank += step[1]
+        index = rank * 8 + file
+        if index == to_index:
+            return squares
+        squares |= 1 << index
+
+# DIRECTION[a][b] is the unit step from square a toward square b (or None), and
+# BETWEEN[a][b] is the set of squares a sliding piece would have to pass over.
+DIRECTION = tuple( tuple( _direction( a, b ) for b in range( 64 ) ) for a in range( 64 ) )
+BETWEEN = tuple( tuple( _between( a, b ) for b in range( 64 ) ) for a in range( 64 ) )
+
+def _step_attacks( from_index: int, steps: tuple[tuple[int, int], ...] ) -> int:
+    """Bitboard of the squares reachable from a square with a single step of each offset."""
+    file, rank = from_index & 7, from_index >> 3
+    attacks = 0
+    for file_step, rank_step in steps:
+        if 0 <= file + file_step <= 7 and 0 <= rank + rank_step <= 7:
+            attacks |= 1 << ( ( rank + rank_step ) * 8 + file + file_step )
+    return attacks
+
+KNIGHT_STEPS = ( ( 1, 2 ), ( -1, 2 ), ( 1, -2 ), ( -1, -2 ), ( -2, 1 ), ( 2, 1 ), ( -2, -1 ), ( 2, -1 ) )
+KING_STEPS = ( ( 1, 0 ), ( -1, 0 ), ( 0, 1 ), ( 0, -1 ), ( 1, 1 ), ( -1, 1 ), ( -1, -1 ), ( 1, -1 ) )
+
+# Squares attacked by a Knight, King, or Pawn standing on a given square.  Pawns attack
+# diagonally forward, so theirs are indexed by color first: PAWN_ATTACKS[color][square].
+KNIGHT_ATTACKS = tuple( _step_attacks( index, KNIGHT_STEPS ) for index in range( 64 ) )
+KING_ATTACKS = tuple( _step_attacks( index, KING_STEPS ) for index in range( 64 ) )
+PAWN_ATTACKS = (
+        tuple( _step_attacks( index, ( ( -1, 1 ), ( 1, 1 ) ) ) for index in range( 64 ) ),
+        tuple( _step_attacks( index, ( ( -1, -1 ), ( 1, -1 ) ) ) for index in range( 64 ) ) )
+
+def knight_attacks( square: int, occupancy: int ) -> int:
+    """Every square a Knight on the given square attacks.  Knights jump, so occupancy doesn't
+    matter; it's only here to match the sliding pieces' attack functions."""
+    return KNIGHT_ATTACKS[square]
+
+def king_attacks( square: int, occupancy: int ) -> int:
+    """Every square a King on the given square attacks.  See knight_attacks about occupancy."""
+    return KING_ATTACKS[square]
+
+# The lateral neighbors of a square, which is where an en passant capture's target sits.
+PAWN_NEIGHBORS = tuple( _step_attacks( index, ( ( -1, 0 ), ( 1, 0 ) ) ) for index in range( 64 ) )
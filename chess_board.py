@@ -1,36 +1,69 @@
 from chess_piece import *
 from color import Color as C
+from bitboard import FILE_INDEX, SQUARE_KEYS, SQUARE_INDEX, square_index, COLORS, COLOR_INDEX, DIRECTION, BETWEEN, iter_bits
+from bitboard import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, PAWN_NEIGHBORS, knight_attacks, king_attacks
+from magics import rook_attacks, bishop_attacks, queen_attacks
+from zobrist import ZOBRIST_PIECE_SQ, ZOBRIST_SIDE, ZOBRIST_EP, ZOBRIST_CASTLE
 from copy import copy, deepcopy
-from typing import Optional, TypeVar
+from typing import Iterable, Optional, TypeVar
 
 CP = TypeVar( 'CP', bound = 'ChessPiece' )
 
+# The piece classes, indexed by their type_id
+PIECE_TYPES = ( Pawn, Knight, Bishop, Rook, Queen, King )
+
+# Each castling right as its bit in the ZOBRIST_CASTLE index, and the King and Rook home squares it needs.
+CASTLING_SQUARES = ( ( 1, 4, 7 ), ( 2, 4, 0 ), ( 4, 60, 63 ), ( 8, 60, 56 ) )
+# The squares each type of piece attacks from a given square, given the board's occupancy,
+# indexed by type_id.  Pawns attack differently depending on color, so they're handled apart.
+PIECE_ATTACKS = ( None, knight_attacks, bishop_attacks, rook_attacks, queen_attacks, king_attacks )
+
+# The starting position, as ( square index, piece type, color ), for setup() to run down
+BACK_RANK = ( Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook )
+INITIAL_POSITION = (
+        tuple( ( file, piece, 'light' ) for file, piece in enumerate( BACK_RANK ) ) +
+        tuple( ( 8 + file, Pawn, 'light' ) for file in range( 8 ) ) +
+        tuple( ( 48 + file, Pawn, 'dark' ) for file in range( 8 ) ) +
+        tuple( ( 56 + file, piece, 'dark' ) for file, piece in enumerate( BACK_RANK ) ) )
+
 class Square:
+    __slots__ = ( 'color', 'file', 'rank', 'occupant', 'key', 'index', 'board' )
+
     def __init__(self, color: Optional[str] = None, file: Optional[str] = None, rank: Optional[int] = None ):
         if None in (color, file, rank):
             raise ValueError( f"Color, file, and rank must be specified for Square.  {color=}, {file=}, {rank=}" )
-        if color is not None and color.lower() not in [ 'light', 'dark' ]:
+        color, file = color.lower(), file.lower()
+        if color not in [ 'light', 'dark' ]:
             raise ValueError( f"Color must be either 'light' or 'dark'.  {color=}." )
-        if rank is not None and int(rank) - 1 not in range( 8 ):
+        if int(rank) - 1 not in range( 8 ):
             raise ValueError( f"Rank must be between 1 and 8.  {rank=}" )
-        if file is not None and file.lower() not in 'abcdefgh':
+        if file not in 'abcdefgh':
             raise ValueError( f"File must be one of 'a' to 'h'.  {file=}" )
-        self.color, self.file, self.rank, self.occupant = color.lower(), file.lower(), rank, None
-        self.key = f"{self.file}{self.rank}"  # e.g. 'a1', 'h8'
+        self.color, self.file, self.rank, self.occupant = color, file, rank, None
+        self.index = square_index( file, int( rank ) ) # e.g. 0, 63
+        self.key = SQUARE_KEYS[self.index]     # e.g. 'a1', 'h8', shared with every other board's Square
+        self.board = None # Set by the owning ChessBoard so it can track its bitboards
 
     def __hash__( self ) -> int:
-        """Returns a hash of the square."""
-        return hash((self.color, self.file, self.rank, self.occupant, self.key))
+        """Returns a hash of the square.  This is just its index, which never changes, so a
+        Square stays findable in a set or dict even when pieces come and go."""
+        return self.index
 
     def __eq__( self, other ) -> bool:
+        """Check if two squares are the same square, i. e. have the same file and rank.  Use
+        state_equals to also compare what's on them."""
+        if not isinstance(other, Square):
+            return False
+        return self.index == other.index
+
+    def state_equals( self, other ) -> bool:
         """Check if two squares are equal based on color, file, rank, and occupant."""
         if not isinstance(other, Square):
             return False
-        return all( (
-            self.color == other.color,
-            self.file == other.file,
-            self.rank == other.rank,
-            self.occupant == other.occupant) )
+        return ( self.color == other.color and
+            self.file == other.file and
+            self.rank == other.rank and
+            self.occupant == other.occupant )
 
     def __deepcopy__( self, memo ):
         """Create a deep copy of the square."""
@@ -39,11 +72,19 @@ class Square:
             deepcopy( self.file, memo ),
             deepcopy( self.rank, memo )
         )
-        if self.is_occupied:
+        if self.is_occupied():
             new_square.occupant = deepcopy( self.occupant, memo )
         return new_square
 
-    @property
+    def blank_copy( self ) -> 'Square':
+        """Return an empty Square, belonging to no board, at the same spot as this one.  This
+        skips __init__ and its validation, since this Square already passed it."""
+        new_square = Square.__new__( Square )
+        new_square.color, new_square.file, new_square.rank = self.color, self.file, self.rank
+        new_square.key, new_square.index = self.key, self.index
+        new_square.occupant, new_square.board = None, None
+        return new_square
+
     def is_occupied(self) -> bool:
         """Check if the square is occupied by a chess piece."""
         return self.occupant is not None
@@ -58,6 +99,8 @@ class Square:
         if not isinstance(piece, ChessPiece):
             raise TypeError( f"Only ChessPiece objects can be placed on a square. Received: {type(piece)}")
         self.occupant = piece
+        if self.board is not None:
+            self.board.toggle_piece( piece, self.index )
 
     def remove( self ) -> CP:
         """Remove the chess piece from the square."""
@@ -65,32 +108,67 @@ class Square:
             raise ValueError( "Square is empty. Cannot remove a piece.")
         piece = self.occupant
         self.occupant = None
+        if self.board is not None:
+            self.board.toggle_piece( piece, self.index )
         return piece
 
     def __str__( self ) -> str:
-        fgc = C.WHITE
-        if self.color == 'dark':
-            bgc = C.BLACK
-        else:
-            bgc = C.BLUE
         if self.occupant is not None:
             piece = str(self.occupant)
         else:
             piece = ' '
-        return fgc( f' {piece} ', fgc, bgc, True )
+        return f'{SQUARE_ESCAPES[self.color]} {piece} {SQUARE_RESET}'
+
+# Squares are always drawn as bold white on blue (light) or black (dark), so work out those
+# escape sequences once rather than for every square every time the board is printed.
+SQUARE_ESCAPES = {
+        'light': C.WHITE.escape( C.WHITE, C.BLUE, True ),
+        'dark':  C.WHITE.escape( C.WHITE, C.BLACK, True ) }
+SQUARE_RESET = C.reset()
+
+# Every board starts out with the same 64 empty Squares, so build (and validate) them once
+# here, and hand each new ChessBoard blank copies of them.
+_SQUARE_TEMPLATE = {
+        f"{file}{rank}": Square(
+            color = 'light' if( FILE_INDEX[file] + rank ) % 2 == 0 else 'dark',
+            file=file,
+            rank=rank)
+        for file in 'abcdefgh' for rank in range(1, 9)
+        }
 
 class ChessBoard:
     def __init__(self):
-        self.squares = {
-                f"{file}{rank}": Square(
-                    color = 'light' if( ord(file) - ord('a') + rank ) % 2 == 0 else 'dark',
-                    file=file,
-                    rank=rank)
-                for file in 'abcdefgh' for rank in range(1, 9)
-                }
-        self.turn = 'light'
+        self.squares = { key: square.blank_copy() for key, square in _SQUARE_TEMPLATE.items() }
+        for square in self.squares.values():
+            square.board = self
+        # The same Squares again, but in index order, for when we've got an index and not a key
+        self.square_list = tuple( self.squares[key] for key in SQUARE_KEYS )
+        self._turn = 'light'
+        self.turn_id = 0 # The same as turn, but 0 or 1 for light or dark
+        self._empty_bitboards()
+        # Moves and captures already worked out for the position with this hash, by square
+        self._movegen_position = None
+        self._movegen_cache = {}
         self.turns = 0
         self.game_states = {}
+        self.repetition_counts = {}
+        # Every position's hash in the order they came up, and where in that list the last
+        # capture or Pawn move was, since nothing before one of those can ever come up again
+        self.history = []
+        self.irreversible_ply = 0
+        self._material = ( 0, 0 ) # ( Pawns, pieces on the board ) as of the last end_turn
+        self._undo_stack = [] # What push_move needs to remember for pop_move to take a move back
+
+    def _empty_bitboards( self ) -> None:
+        """Set the bitboards, King squares, and hash to those of a board with nothing on it."""
+        # One bitboard per piece type per color, indexed by color * 6 + type_id,
+        # plus occupancy for each color and for the board as a whole.
+        self.bb = [0] * 12
+        self.occ = [0, 0]
+        self.occ_all = 0
+        self.king_sq = [None, None] # Where each color's King is, so we don't have to go looking
+        # The Zobrist hash of the pieces and the side to move, kept up to date as they change
+        self.zobrist = ZOBRIST_SIDE if self.turn_id else 0
 
     def __eq__( self, other ) -> bool:
         """Check if two chess boards are equal based on their squares."""
@@ -98,40 +176,85 @@ class ChessBoard:
         if not isinstance(other, ChessBoard):
             return False
         # Check if the number of squares and their contents are the same
-        if len( self.squares ) != len( other.squares ) or not all( [ self.squares[key] == other.squares[key] for key in self.squares ] ):
+        if len( self.squares ) != len( other.squares ) or not all( self.squares[key].state_equals( other.squares[key] ) for key in self.squares ):
             return False
-        return all( ( self.turn == other.turn, self.turns == other.turns, self.game_states == other.game_states ) )
+        return self.turn == other.turn and self.turns == other.turns and self.game_states == other.game_states
 
     def __hash__( self ) -> int:
-        """Returns a hash of the chess board."""
-        # First we need to make an immutable representation of the Squares dictionary:
-        squares_tuple = tuple(sorted((key, hash(value)) for key, value in self.squares.items()))
-        # Now, same for game states:
-        game_states_tuple = tuple(sorted((key, value) for key, value in self.game_states.items()))
-        # Finally, we can return a hash of the immutables:
-        return hash( ( self.turn, self.turns, squares_tuple, game_states_tuple ) )
+        """Returns the Zobrist hash of the position: pieces, side to move, en passant, and
+        castling rights.  Two boards with the same position hash the same however they got there."""
+        return self.zobrist ^ self._flags_key()
+
+    @property
+    def turn( self ) -> str:
+        """Whose turn it is, 'light' or 'dark'."""
+        return self._turn
+
+    @turn.setter
+    def turn( self, color: str ) -> None:
+        if color != self._turn:
+            self.zobrist ^= ZOBRIST_SIDE
+        self._turn = color
+        self.turn_id = COLOR_INDEX[color]
+
+    @property
+    def opponent( self ) -> str:
+        """Whose turn it isn't, 'light' or 'dark'."""
+        return COLORS[self.turn_id ^ 1]
+
+    def _flags_key( self ) -> int:
+        """The Zobrist keys for en passant and castling rights.  These come from flags on the
+        pieces themselves, which get raised and lowered without the board knowing, so they're
+        looked up when needed rather than kept up to date; there are only the Pawns and a few
+        castling squares to check."""
+        key = 0
+        # In a real game a vulnerable Pawn has just moved two squares, so it's on rank 4 or 5, but
+        # nothing stops the flag being raised anywhere else, and the move generator will honor it
+        # wherever it is.  So look at every Pawn, and key it by its square, not just its file.
+        for index in iter_bits( self.bb[PAWN] | self.bb[6 + PAWN] ):
+            if self.square_list[index].occupant.vulnerable:
+                key ^= ZOBRIST_EP[index]
+        return key ^ ZOBRIST_CASTLE[self.castling_rights]
+
+    @property
+    def castling_rights( self ) -> int:
+        """The castles still possible as far as the King and Rook are concerned, as a bitmask
+        in the usual K Q k q order: 1 light kingside, 2 light queenside, 4 dark kingside, and
+        8 dark queenside.  A right is there if both pieces are home and neither has moved; whether
+        the squares are clear or attacked is up to ChessCastle."""
+        rights = 0
+        for bit, king_index, rook_index in CASTLING_SQUARES:
+            color = king_index >> 5 # 0 for rank 1, 1 for rank 8
+            if self.bb[color * 6 + KING] >> king_index & 1 and self.bb[color * 6 + ROOK] >> rook_index & 1:
+                if not ( self.square_list[king_index].occupant.has_moved or self.square_list[rook_index].occupant.has_moved ):
+                    rights |= bit
+        return rights
 
     def __deepcopy__( self, memo ):
-        """Create an exact copy of this chess board.  Primarily used for the following purposes:
-         - Saving game states
-         - Looking for discovered checks in proposed moves"""
+        """Create an exact copy of this chess board."""
         new_board = ChessBoard()
         for k, v in self.squares.items():
-            new_board.squares[k] = deepcopy(v)
+            if v.is_occupied():
+                new_board.squares[k].place( deepcopy( v.occupant, memo ) )
         new_board.turn = str( self.turn )
         new_board.turns = int( self.turns )
         new_board.game_states = self.game_states.copy()
+        new_board.repetition_counts = self.repetition_counts.copy()
+        new_board.history = self.history.copy()
+        new_board.irreversible_ply = self.irreversible_ply
+        new_board._material = self._material
         return new_board
 
     def end_turn( self ) -> None:
-        # When ending a side's half-turn, we need to reset the en passant flag for all pawns of that side.
-        for _ in self.squares.values():
-            piece = _.contains()
-            if isinstance(piece, Pawn) and piece.color != self.turn:
-                piece.lower_passant_flag()
-            if isinstance(piece, King) and piece.color != self.turn:
-                if self.is_in_check_from( _, self.turn ):
-                    piece.raise_check_flag()
+        # When ending a side's half-turn, we need to reset the en passant flag for all pawns of the
+        # other side, and see whether the other side's King is now in check.  The bitboards tell
+        # us where those pieces are, so there's no need to look at every square.
+        other = self.turn_id ^ 1
+        for index in iter_bits( self.bb[other * 6 + PAWN] ):
+            self.square_list[index].occupant.lower_passant_flag()
+        for index in iter_bits( self.bb[other * 6 + KING] ):
+            if self._is_attacked( index, other ^ 1 ):
+                self.square_list[index].occupant.raise_check_flag()
         # DONE: Clear en-passant vulnerable flags
         # DONE: Look for Kings in check
         # TODO: Look for checkmates (!)  Hoo boy, this will be fun.
@@ -139,12 +262,104 @@ class ChessBoard:
         # TODO: Look for stalemate: no legal moves
         # TODO: Look for 50-turn draw
         # TODO: Look for forced draw due to lack of pieces on both sides
-        if self.turn == 'light':
+        if not self.turn_id: # light
             self.turns += 1
 
+        mover = self.turn
+        self.turn = self.opponent
+        # Record the position each half-turn left behind by its hash, and count how many times
+        # each position has come up, for spotting repetitions later
+        position = hash( self )
+        self.game_states[ ( self.turns, mover ) ] = position
+        self.repetition_counts[position] = self.repetition_counts.get( position, 0 ) + 1
+        # A capture changes the piece count and a Pawn move changes where the Pawns are
+        material = ( self.bb[PAWN] | self.bb[6 + PAWN], self.occ_all.bit_count() )
+        if material != self._material:
+            self.irreversible_ply = len( self.history )
+            self._material = material
+        self.history.append( position )
+
+    def is_repetition( self ) -> bool:
+        """Check whether the current position has come up before.  Only positions with the same
+        side to move can match, so we go back through the history two at a time, starting with
+        the most recent (short repetitions are the likeliest), and stop at the last capture or
+        Pawn move."""
+        if not self.history:
+            return False
+        position = self.history[-1]
+        for ply in range( len( self.history ) - 3, self.irreversible_ply - 1, -2 ):
+            if self.history[ply] == position:
+                return True
+        return False
 
-        self.game_states[ ( self.turns, self.turn ) ] = deepcopy( self )
-        self.turn = 'light' if self.turn == 'dark' else 'dark'
+    def toggle_piece( self, piece: CP, index: int ) -> None:
+        """Flip a piece's bit in the bitboards.  Called by Square whenever it gains or
+        loses an occupant, which keeps the bitboards in step with the squares."""
+        color = piece.color_id
+        slot = piece.piece_id
+        bit = 1 << index
+        self.bb[slot] ^= bit
+        self.occ[color] ^= bit
+        self.occ_all ^= bit
+        self.zobrist ^= ZOBRIST_PIECE_SQ[slot][index]
+        if slot % 6 == KING:
+            king = self.bb[slot]
+            self.king_sq[color] = king.bit_length() - 1 if king else None
+
+    def make_move( self, from_index: int, to_index: int, captured_index: Optional[int] = None ) -> tuple[CP, Optional[CP]]:
+        """Make a move on the bitboards alone, leaving the Squares as they are, so that we can
+        ask questions of the resulting position (e. g. is our King in check?) and then take the
+        move back with unmake_move, which needs whatever this returns.  The captured piece is
+        usually on to_index, but en passant is the exception, hence captured_index."""
+        mover = self.square_list[from_index].occupant
+        captured = None
+        if captured_index is not None:
+            captured = self.square_list[captured_index].occupant
+            self.toggle_piece( captured, captured_index )
+        self.toggle_piece( mover, from_index )
+        self.toggle_piece( mover, to_index )
+        return mover, captured
+
+    def unmake_move( self, from_index: int, to_index: int, captured_index: Optional[int], pieces: tuple[CP, Optional[CP]] ) -> None:
+        """Take back a move made by make_move.  Toggling is its own inverse, so this is the
+        same flips again, which restores the bitboards, the King squares, and the hash."""
+        mover, captured = pieces
+        self.toggle_piece( mover, to_index )
+        self.toggle_piece( mover, from_index )
+        if captured is not None:
+            self.toggle_piece( captured, captured_index )
+
+    def push_move( self, from_index: int, to_index: int, captured_index: Optional[int] = None ) -> None:
+        """Play a move for real, Squares and all, and hand the turn to the other side, without
+        any of ChessMove's validation or end_turn's bookkeeping, for trying moves out while
+        searching.  pop_move takes back the most recent one.  en passant flags and promotions
+        are left to ChessMove."""
+        pieces = self.make_move( from_index, to_index, captured_index )
+        mover, captured = pieces
+        # The bitboards are already up to date, so move the occupants around directly rather than
+        # through Square.place and Square.remove, which would toggle the pieces a second time
+        if captured is not None:
+            self.square_list[captured_index].occupant = None
+        self.square_list[from_index].occupant = None
+        self.square_list[to_index].occupant = mover
+        had_moved = getattr( mover, 'has_moved', None ) # Only Pawns, Rooks, and Kings keep track
+        if had_moved is False:
+            mover.has_moved = True
+        self.turn = self.opponent
+        self._undo_stack.append( ( from_index, to_index, captured_index, pieces, had_moved ) )
+
+    def pop_move( self ) -> None:
+        """Take back the last move played with push_move."""
+        from_index, to_index, captured_index, pieces, had_moved = self._undo_stack.pop()
+        mover, captured = pieces
+        self.turn = self.opponent
+        if had_moved is False:
+            mover.has_moved = False
+        self.square_list[to_index].occupant = None
+        self.square_list[from_index].occupant = mover
+        if captured is not None:
+            self.square_list[captured_index].occupant = captured
+        self.unmake_move( from_index, to_index, captured_index, pieces )
 
     def place_piece(self, piece: CP, file: str, rank: int) -> None:
         """place a chess piece on the board at the specified file and rank."""
@@ -157,156 +372,229 @@ class ChessBoard:
         """Remove a chess piece from the board at the specified file and rank."""
         if key not in self.squares:
             raise ValueError(f"Invalid square: {key}. Must be in the format 'a1' to 'h8'.")
-        if self.squares[key].is_occupied:
+        if self.squares[key].is_occupied():
             return self.squares[key].remove()
         else:
             raise ValueError(f"No piece on {key} to remove.")
 
     def __getitem__( self, square_key: str ) -> Square:
         """Get the square at the specified key."""
-        if square_key not in self.squares:
+        # One dict lookup, rather than one to check the key and another to fetch the Square
+        square = self.squares.get( square_key )
+        if square is None:
             raise ValueError(f"Invalid square: {square_key}. Must be in the format 'a1' to 'h8'.")
-        return self.squares[square_key]
+        return square
 
     def get_piece(self, square_key: str) -> Optional[CP]:
         """Get the chess piece at the specified square."""
-        if square_key not in self.squares:
+        square = self.squares.get( square_key )
+        if square is None:
             raise ValueError(f"Invalid square: {square_key}. Must be in the format 'a1' to 'h8'.")
-        return self.squares[square_key].contains()
+        return square.occupant
 
     def is_discovered_check( self, from_square_key: str, to_square_key: str, is_capture: bool = False ) -> bool:
         """Determine whether a proposed move would be a disovered check, so that
         it can be eliminated from a proposed list of moves or captures to return to ChessMove"""
-        # Make a copy of the board for starters
-        hypothetical = deepcopy( self )
-        # We have a from_square_key and a to_square_key.  Let's get keys and squares for both.
-        from_square = hypothetical[from_square_key]
-        to_square = hypothetical[to_square_key]
-        moving_player = self.turn
-        passive_player = 'light' if self.turn == 'dark' else 'dark'
+        return self._exposes_king( SQUARE_INDEX[from_square_key], SQUARE_INDEX[to_square_key], is_capture )
 
-        if is_capture:
-            # If this is an en passant capture, we need to remove the pawn and then shift the to_square
-            # before making the hypothetical move.  So let's determine if this is en-passant:
-            if is_capture and from_square.rank == to_square.rank and isinstance( from_square.contains(), Pawn ): # it is!
-                to_square.remove()
-                new_rank = from_square.rank + from_square.contains().direction # type: ignore as we know origin square contains a Pawn
-                to_square = hypothetical[ f'{to_square.file}{str(new_rank)}']
-                to_square_key = to_square.key
-            else: # It's a capture, but not en passant
-                to_square.remove()
-        hypothetical.move_piece( from_square_key, to_square_key )
-        # Go through the checklist for discovered-check sitiations
-        for square_key in hypothetical.squares:
-            piece = hypothetical.get_piece(square_key)
-            if piece is not None and isinstance( piece, King ) and piece.color == moving_player:
-                if hypothetical.is_in_check_from( hypothetical.squares[square_key], passive_player ):
-                    # We have a discovered check!
-                    return True
-        # Well, I guess it's not.
-        return False
+    def _exposes_king( self, from_index: int, to_index: int, is_capture: bool ) -> bool:
+        """is_discovered_check, but with square indices, for internal use."""
+        captured_index = None
+        moving_player = self.turn_id
 
-
-    def get_legal_moves( self, square_key: str ) -> list[Square]:
-        """Get all legal moves for the piece on the specified square.
-        Captures are NOT included in the list of legal moves, only moves to empty squares."""
+        if is_capture:
+            captured_index = to_index
+            # If this is an en passant capture, the capturing Pawn actually ends up on the
+            # square behind the one it captures.  So let's determine if this is en-passant:
+            piece = self.square_list[from_index].contains()
+            if from_index >> 3 == to_index >> 3 and piece.type_id == PAWN: # it is!
+                to_index += 8 * piece.direction
+
+        # Make the move, see if our King is under attack, and take the move back again
+        pieces = self.make_move( from_index, to_index, captured_index )
+        king_index = self.king_sq[moving_player]
+        in_check = king_index is not None and self._is_attacked( king_index, moving_player ^ 1 )
+        self.unmake_move( from_index, to_index, captured_index, pieces )
+        return in_check
+
+    def _position_cache( self ) -> dict:
+        """The move generation cache for the current position.  It's thrown away as soon as the
+        position's hash changes, so anything in it was worked out for exactly this position.
+
+        Hashing looks at every Pawn for the en passant flag, so each public query asks for the
+        cache once and hands it down to the helpers below, rather than each of them asking again."""
+        position = hash( self )
+        if position != self._movegen_position:
+            self._movegen_position = position
+            self._movegen_cache = {}
+        return self._movegen_cache
+
+    def _pseudo_legal( self, origin: int, piece: CP, cache: dict ) -> tuple[int, int]:
+        """Get bitboards of the moves and the captures the piece on the origin square could make,
+        before ruling out the ones that leave its own King in check.  Both come out of the same
+        attack lookup, so they're worked out (and cached) together."""
+        # A Pawn's first move is the one thing the position's hash doesn't know about
+        cache_key = ( origin, piece.type_id == PAWN and piece.has_moved )
+        if cache_key in cache:
+            return cache[cache_key]
+
+        color = piece.color_id
+        enemies = self.occ[color ^ 1]
+        if piece.type_id != PAWN:
+            # Any square the piece attacks is a move, as long as nobody's there, or a capture, if
+            # an enemy is.  For sliding pieces, that includes the first piece in each direction.
+            attacks = PIECE_ATTACKS[piece.type_id]( origin, self.occ_all )
+            possible_moves = attacks & ~self.occ_all
+            possible_captures = attacks & enemies
+        else:
+            # Pawns don't move the way they attack, so walk their movement pattern
+            possible_moves = 0
+            for file_dir, rank_dir in piece.get_move_pattern():
+                current_file = ( origin & 7 ) + file_dir
+                current_rank = ( origin >> 3 ) + rank_dir
+                if not ( 0 <= current_file <= 7 and 0 <= current_rank <= 7 ):
+                    # We're off the board, and so we
+                    continue
+                target = current_rank * 8 + current_file
+                if not self.occ_all >> target & 1:
+                    possible_moves |= 1 << target
+            # Pawns capture one square diagonally forward...
+            possible_captures = PAWN_ATTACKS[color][origin] & enemies
+            # ...or en passant, laterally, in which case the target needs to be a vulnerable
+            # Pawn, and the square behind it needs to be empty.
+            for target in iter_bits( PAWN_NEIGHBORS[origin] & self.bb[( color ^ 1 ) * 6 + PAWN] ):
+                behind = target + 8 * piece.direction
+                if self.square_list[target].contains().is_vulnerable and not self.occ_all >> behind & 1:
+                    possible_captures |= 1 << target
+
+        cache[cache_key] = ( possible_moves, possible_captures )
+        return possible_moves, possible_captures
+
+    def _compute_pins( self, color: int, cache: dict ) -> dict[int, int]:
+        """Find the given color's pinned pieces: those standing alone between their own King and
+        an enemy sliding piece.  Returns { pinned square: bitboard of squares it may still go },
+        which is the line between the King and the pinner, plus the pinner itself."""
+        king_index = self.king_sq[color]
+        if king_index is None:
+            return {}
+        cache_key = ( 'pins', color )
+        if cache_key in cache:
+            return cache[cache_key]
+        pins = {}
+        base = ( color ^ 1 ) * 6
+        straight = self.bb[base + ROOK] | self.bb[base + QUEEN]
+        diagonal = self.bb[base + BISHOP] | self.bb[base + QUEEN]
+        for pinner in iter_bits( straight | diagonal ):
+            step = DIRECTION[king_index][pinner]
+            if step is None:
+                continue
+            if not ( straight if 0 in step else diagonal ) >> pinner & 1:
+                continue # e. g. a Rook on the King's diagonal
+            # Exactly one piece in between, and it's ours?  Then it's pinned.
+            between = BETWEEN[king_index][pinner] & self.occ_all
+            if between and not between & ( between - 1 ) and between & self.occ[color]:
+                pins[between.bit_length() - 1] = BETWEEN[king_index][pinner] | 1 << pinner
+        cache[cache_key] = pins
+        return pins
+
+    def _legal_targets( self, origin: int, piece: CP, targets: int, is_capture: bool, cache: dict ) -> int:
+        """Remove the targets from the bitboard that would leave the side to move's King in
+        check.  Most of the time the pins say it all; the King itself, en passant, and moving
+        while already in check need the piece actually moved to see."""
+        moving_player = self.turn_id
+        king_index = self.king_sq[moving_player]
+        if king_index is None:
+            return targets
+        if ( piece.color_id == moving_player and piece.type_id != KING and
+                not ( piece.type_id == PAWN and is_capture and PAWN_NEIGHBORS[origin] & targets ) and
+                not self._is_attacked( king_index, moving_player ^ 1 ) ):
+            pins = self._compute_pins( moving_player, cache )
+            return targets & pins[origin] if origin in pins else targets
+        legal = 0
+        for target in iter_bits( targets ):
+            if not self._exposes_king( origin, target, is_capture ):
+                legal |= 1 << target
+        return legal
+
+    def get_legal_targets( self, square_key: str, is_capture: bool = False ) -> int:
+        """Get a bitboard of the squares the piece on the specified square can legally move to
+        (or capture on, with is_capture), so that asking about one destination is a single bit
+        test.  get_legal_moves and get_legal_captures hand out the same thing as Squares."""
         if square_key not in self.squares:
             raise ValueError(f"Invalid square: {square_key}. Must be in the format 'a1' to 'h8'.")
         piece = self.squares[square_key].contains()
         if piece is None:
-            return []  # No piece on the square, no legal moves
-
-        # Get the piece's movement pattern and translate it to squares
-        legal_moves = []
-        possible_moves = []
-
-        for file_dir, rank_dir in piece.get_move_pattern():
-            current_file_ord = ord(square_key[0])
-            current_rank = int(square_key[1])
-
-            while True: # I hate infinite loops but we _will_ break out eventually.
-                current_file_ord += file_dir
-                current_rank += rank_dir
-
-                if not ( 97 <= current_file_ord <= 104 and 1 <= current_rank <= 8 ):
-                    # We're off the board, and so we
-                    break
-                target_square = self.squares[f'{chr(current_file_ord)}{current_rank}']
-
-                if target_square.is_occupied:
-                    # The path is blocked by a piece, and so we
-                    break
-
-                possible_moves.append( target_square )
-
-                if not piece.is_sliding_piece:
-                    # No further squares in this direction to check, and so we
-                    break
-
-        # Remove duplicates and return the list of legal moves
-        possible_moves = list( set( possible_moves ) )
-
-        # Okay, now we have a list of presumable legal moves.  For each one, we need to
-        # see if it would be a discovered check and, if so, remove it from the list.
-        for possible_move in possible_moves:
-            if not self.is_discovered_check( square_key, possible_move.key, False ):
-                legal_moves.append( possible_move )
-        return list(set(legal_moves))
+            return 0 # No piece on the square, nowhere to go
+        return self._cached_targets( square_key, piece, is_capture, self._position_cache() )
+
+    def _cached_targets( self, square_key: str, piece: CP, is_capture: bool, cache: dict ) -> int:
+        """get_legal_targets, for a piece already looked up, with the position cache in hand."""
+        cache_key = ( square_key, is_capture, piece.type_id == PAWN and piece.has_moved )
+        if cache_key in cache:
+            return cache[cache_key]
+
+        # Okay, get a bitboard of presumable legal moves or captures, and leave out any that
+        # would be a discovered check.
+        origin = SQUARE_INDEX[square_key]
+        possible = self._pseudo_legal( origin, piece, cache )[is_capture]
+        legal = self._legal_targets( origin, piece, possible, is_capture, cache )
+        cache[cache_key] = legal
+        return legal
+
+    def _target_squares( self, square_key: str, is_capture: bool ) -> tuple[Square, ...]:
+        """get_legal_targets, as a tuple of Squares, also cached."""
+        targets = self.get_legal_targets( square_key, is_capture )
+        cache = self._movegen_cache # get_legal_targets just brought it up to date
+        cache_key = ( 'squares', targets )
+        if cache_key not in cache:
+            cache[cache_key] = tuple( self.square_list[target] for target in iter_bits( targets ) )
+        return cache[cache_key]
+
+    def get_legal_moves( self, square_key: str ) -> tuple[Square, ...]:
+        """Get all legal moves for the piece on the specified square.
+        Captures are NOT included in the list of legal moves, only moves to empty squares."""
+        return self._target_squares( square_key, False )
 
-    def get_legal_captures( self, square_key: str ) -> list[Square]:
+    def get_legal_captures( self, square_key: str ) -> tuple[Square, ...]:
         """Get all legal captures for the piece on the specified square."""
-        if square_key not in self.squares:
-            raise ValueError(f"Invalid square: {square_key}. Must be in the format 'a1' to 'h8'.")
-        piece = self.squares[square_key].contains()
+        return self._target_squares( square_key, True )
+
+    def can_reach( self, from_key: str, to_key: str ) -> bool:
+        """Check whether the piece on from_key can legally move or capture to to_key.  Moves only
+        go to empty squares and captures only to occupied ones (en passant included, since it
+        names the captured Pawn's square), so only one of the two bitboards needs asking about."""
+        target = SQUARE_INDEX[to_key]
+        return bool( self.get_legal_targets( from_key, bool( self.occ_all >> target & 1 ) ) >> target & 1 )
+
+    def is_pseudo_legal( self, from_key: str, to_key: str, is_capture: bool = False ) -> bool:
+        """Check whether the piece on from_key could move (or capture) to to_key, going by how it
+        moves and what's in the way, but without asking whether that leaves its King in check."""
+        if from_key not in self.squares or to_key not in self.squares:
+            raise ValueError(f"Invalid square keys: {from_key}, {to_key}. Must both be in the format 'a1' to 'h8'.")
+        piece = self.squares[from_key].contains()
         if piece is None:
-            return [] # No piece on the square, no legal captures
-        # Get the piece's capture pattern and translate it to squares
-        possible_captures = []
-        legal_captures = []
-
-        for capture in piece.get_capture_pattern():
-            target_file_ord = ord(square_key[0]) + capture[0]
-            target_rank = int(square_key[1]) + capture[1]
-            if 97 <= target_file_ord <= 104 and 1 <= target_rank <= 8:
-                target_square_key = f"{chr(target_file_ord)}{target_rank}"
-                target_square = self.squares[target_square_key]
-                if target_square is not None:
-                    if target_square.is_occupied and target_square.contains().color != piece.color:
-                        captured_piece = self[target_square_key].contains()
-                        # If we are capturing with a Pawn, and the capture is en passant,
-                        # we need to check if the target square is vulnerable
-                        if isinstance( piece, Pawn ) and isinstance ( captured_piece, Pawn ) and capture in [ ( -1, 0 ), ( 1, 0 ) ]:
-                            if captured_piece.is_vulnerable:
-                                # Check to see if the square behind the target square is empty
-                                final_rank = target_rank + piece.direction
-                                final_square_key = f"{target_square_key[0]}{final_rank}"
-                                if not self.squares[final_square_key].is_occupied:
-                                    possible_captures.append(target_square)
-                        else:
-                            possible_captures.append(target_square)
-            if piece.is_sliding_piece:
-                # For sliding pieces, we need to check all squares in the direction of capture
-                step_file_ord = ord(square_key[0]) + capture[0]
-                step_rank = int(square_key[1]) + capture[1]
-                while 97 <= step_file_ord <= 104 and 1 <= step_rank <= 8:
-                    step_square_key = f"{chr(step_file_ord)}{step_rank}"
-                    step_square = self.squares[step_square_key]
-                    if step_square.is_occupied and step_square.contains().color != piece.color:
-                        possible_captures.append(step_square)
-                        break
-                    elif step_square.is_occupied:
-                        break
-                    step_file_ord += capture[0]
-                    step_rank += capture[1]
-        possible_captures = list( set( possible_captures ) ) # Strip duplicates
-
-        # Okay, now we have a list of presumable legal captures.  For each one, we need to
-        # see if it would be a discovered check and, if so, remove it from the list.
-        for possible_capture in possible_captures:
-            if not self.is_discovered_check( square_key, possible_capture.key, True ):
-                legal_captures.append( possible_capture )
-        # Remove duplicates and return the list of legal captures
-        return list(set(legal_captures))
+            return False
+        return bool( self._pseudo_legal( SQUARE_INDEX[from_key], piece, self._position_cache() )[is_capture] >> SQUARE_INDEX[to_key] & 1 )
+
+    def validate_many( self, from_keys: Iterable[str], to_keys: Iterable[str], is_capture: bool = False ) -> list[bool]:
+        """Check a whole batch of candidate moves (or captures) at once, without making a ChessMove
+        for each, e. g. to weed out a perft or search driver's candidates.  The answer for a pair
+        is whether the side to move's piece on the from key can legally go to the to key.
+        Each origin's legal targets come out of the position cache as one bitboard, so each pair
+        costs a single bit test.  Castling isn't covered; ask ChessCastle about that."""
+        turn_id = self.turn_id
+        cache = self._position_cache() # The whole batch is asked about the same position
+        targets = {}
+        results = []
+        for from_key, to_key in zip( from_keys, to_keys ):
+            if from_key not in self.squares or to_key not in self.squares:
+                raise ValueError(f"Invalid square keys: {from_key}, {to_key}. Must both be in the format 'a1' to 'h8'.")
+            if from_key not in targets:
+                piece = self.squares[from_key].contains()
+                owned = piece is not None and piece.color_id == turn_id
+                targets[from_key] = self._cached_targets( from_key, piece, is_capture, cache ) if owned else 0
+            results.append( bool( targets[from_key] >> SQUARE_INDEX[to_key] & 1 ) )
+        return results
 
     def move_piece( self, from_key: str, to_key: str ) -> None:
         """Move a piece from one Square to another.
@@ -323,20 +611,20 @@ class ChessBoard:
         from_square = self.squares[from_key]
         to_square = self.squares[to_key]
 
-        if not all( ( isinstance(from_square, Square), isinstance(to_square, Square) ) ):
-            raise TypeError("from_square and to_square must be instances of Square.")
-        if not from_square.is_occupied:
+        if not from_square.is_occupied():
             raise ValueError(f"No piece on {from_square} to move.")
-        if to_square.is_occupied:
+        if to_square.is_occupied():
             raise ValueError(f"Cannot move to {to_square}. It is already occupied by {to_square.contains()}.")
 
         to_square.place( from_square.remove() )
 
     def clear(self):
         """Reset the chess board by removing all pieces."""
-        for square in self.squares.values():
-            if square.is_occupied:
-                square.remove()
+        # Only the occupied Squares need emptying, and the bitboards know which those are.  Then
+        # rather than toggle the pieces off one at a time, just start the bitboards over.
+        for index in iter_bits( self.occ_all ):
+            self.square_list[index].occupant = None
+        self._empty_bitboards()
 
     def setup(self):
         """Set up the chess board with the initial positions of the pieces."""
@@ -345,110 +633,77 @@ class ChessBoard:
         self.turn = 'light'
         self.turns = 0
         self.game_states = {}
-
-        # place Pawns
-        for file in 'abcdefgh':
-            self.place_piece(Pawn('light'), file, 2)
-            self.place_piece(Pawn('dark'), file, 7)
-
-        # place Rooks
-        self.place_piece(Rook('light'), 'a', 1)
-        self.place_piece(Rook('light'), 'h', 1)
-        self.place_piece(Rook('dark'), 'a', 8)
-        self.place_piece(Rook('dark'), 'h', 8)
-
-        # place Knights
-        self.place_piece(Knight('light'), 'b', 1)
-        self.place_piece(Knight('light'), 'g', 1)
-        self.place_piece(Knight('dark'), 'b', 8)
-        self.place_piece(Knight('dark'), 'g', 8)
-
-        # place Bishops
-        self.place_piece(Bishop('light'), 'c', 1)
-        self.place_piece(Bishop('light'), 'f', 1)
-        self.place_piece(Bishop('dark'), 'c', 8)
-        self.place_piece(Bishop('dark'), 'f', 8)
-
-        # place Queens
-        self.place_piece(Queen('light'), 'd', 1)
-        self.place_piece(Queen('dark'), 'd', 8)
-
-        # place Kings
-        self.place_piece(King('light'), 'e', 1)
-        self.place_piece(King('dark'), 'e', 8)
+        self.repetition_counts = {}
+        self.history = []
+        self.irreversible_ply = 0
+        self._undo_stack = []
+
+        # Place the pieces straight onto their Squares; the manifest is known good, so there's no
+        # need for place_piece to look the keys up and check them
+        for index, piece_type, color in INITIAL_POSITION:
+            self.square_list[index].place( piece_type( color ) )
+
+        # The starting position counts as having come up, too
+        position = hash( self )
+        self.repetition_counts[position] = 1
+        self.history.append( position )
+        self._material = ( self.bb[PAWN] | self.bb[6 + PAWN], self.occ_all.bit_count() )
 
     def is_in_check_from( self, target_square: Square, attacking_color: str) -> bool:
         """Determine whether a specified square is under attack from the specified player's pieces."""
-        for square_key, square in self.squares.items():
-            piece = square.contains()
-            if not piece or piece.color != attacking_color:
-                continue
-
-            file_offset = ord(target_square.file) - ord(square.file)
-            rank_offset = target_square.rank - square.rank # type: ignore
-
-            # If there's no offset, it's the same square, so no attack
-            if file_offset == 0 and rank_offset == 0:
-                continue
-
-            # Determine the base direction of the attack (e.g., (0, -7) -> (0, -1))
-            file_dir = 0 if file_offset == 0 else (1 if file_offset > 0 else -1)
-            rank_dir = 0 if rank_offset == 0 else (1 if rank_offset > 0 else -1)
-
-            # For Pawns, the capture pattern is exact and non-sliding
-            if isinstance(piece, Pawn):
-                if (file_offset, rank_offset) in piece.get_capture_pattern():
-                    return True
-                else:
-                    continue # Pawns don't slide, so move to the next piece
-
-            # For all other pieces (sliding and non-sliding like King/Knight)
-            if (file_dir, rank_dir) in piece.get_capture_pattern():
-                if not piece.is_sliding_piece:
-                    # For King/Knight, the offset must be exact
-                    if (file_offset, rank_offset) in piece.get_capture_pattern():
-                        return True
-                else:
-                    # For sliding pieces, check if the path is clear
-                    if self._is_sliding_path_clear(square, target_square, file_offset, rank_offset):
-                        return True
+        return self._is_attacked( target_square.index, COLOR_INDEX[attacking_color] )
+
+    def _is_attacked( self, target: int, attacking_color: int ) -> bool:
+        """is_in_check_from, but with a square index and a color index, for internal use."""
+        base = attacking_color * 6
+        # A Pawn attacks our target if a Pawn of the _other_ color standing on the target would
+        # attack the Pawn's square, so look the target up in the defender's Pawn table.
+        if PAWN_ATTACKS[attacking_color ^ 1][target] & self.bb[base + PAWN]:
+            return True
+        if KNIGHT_ATTACKS[target] & self.bb[base + KNIGHT]:
+            return True
+        if KING_ATTACKS[target] & self.bb[base + KING]:
+            return True
+
+        # Sliding attacks work both ways, too: a Rook (or Queen) attacks the target exactly when
+        # a Rook on the target would see it, so one lookup from the target covers all of them.
+        if rook_attacks( target, self.occ_all ) & ( self.bb[base + ROOK] | self.bb[base + QUEEN] ):
+            return True
+        if bishop_attacks( target, self.occ_all ) & ( self.bb[base + BISHOP] | self.bb[base + QUEEN] ):
+            return True
 
         return False
 
-    def _is_sliding_path_clear( self, from_square, to_square, file_offset, rank_offset) -> bool:
-        """Check if the path is clear for a sliding piece's attack."""
-        file_step = 0 if file_offset == 0 else (1 if file_offset > 0 else -1 )
-        rank_step = 0 if rank_offset == 0 else (1 if rank_offset > 0 else -1 )
-
-        # We're not currently handling diagonals properly.  This thinks that Qd1 can see Ke8 for example.  So let's rule out diagonals that
-        # don't actually line up.
-        if file_offset and rank_offset and abs( file_offset ) != abs( rank_offset ):
-            # This is not on the _same_ diagonal, so-
-            return False
-
-        # Start from the square after the attacking piece
-        current_file_ord = ord( from_square.file ) + file_step
-        current_rank = from_square.rank + rank_step
-
-        # Check each square in the path (excluding the target itself)
-        while( current_file_ord != ord(to_square.file) or current_rank != to_square.rank ) and ( 0 < current_rank < 9 ) and ( 96 < current_file_ord < 105 ):
-              current_square_key = f'{chr(current_file_ord)}{current_rank}'
-              if self.squares[current_square_key].is_occupied:
-                  return False # Path is blocked
-              current_file_ord += file_step
-              current_rank += rank_step
-        return True # Path is clear
+    def attacked_squares( self, attacking_color: str ) -> int:
+        """Get a bitboard of every square the specified player's pieces attack, so that asking
+        about several squares in the same position (e. g. a castling King's path) is one bit
+        test each.  Worked out once per position and cached."""
+        return self._attack_map( COLOR_INDEX[attacking_color], self._position_cache() )
+
+    def _attack_map( self, attacking_color: int, cache: dict ) -> int:
+        """attacked_squares, but with a color index and the position cache, for internal use."""
+        cache_key = ( 'attacks', attacking_color )
+        if cache_key in cache:
+            return cache[cache_key]
+        base = attacking_color * 6
+        attacks = 0
+        for index in iter_bits( self.bb[base + PAWN] ):
+            attacks |= PAWN_ATTACKS[attacking_color][index]
+        for type_id in range( KNIGHT, KING + 1 ):
+            piece_attacks = PIECE_ATTACKS[type_id]
+            for index in iter_bits( self.bb[base + type_id] ):
+                attacks |= piece_attacks( index, self.occ_all )
+        cache[cache_key] = attacks
+        return attacks
 
     def __str__(self) -> str:
-        game_board = '    A  B  C  D  E  F  G  H \n'
+        game_board = [ '    A  B  C  D  E  F  G  H \n' ]
         for rank in range( 8, 0, -1 ):
-            game_board += f'{rank}: '
-            for file in 'abcdefgh':
-                square = self.squares[f'{file}{str(rank)}']
-                game_board += f'{square}'
-            game_board += '\n'
-        game_board += '    A  B  C  D  E  F  G  H \n'
-        return game_board
+            game_board.append( f'{rank}: ' )
+            game_board.extend( map( str, self.square_list[( rank - 1 ) * 8 : rank * 8] ) )
+            game_board.append( '\n' )
+        game_board.append( '    A  B  C  D  E  F  G  H \n' )
+        return ''.join( game_board )
 
 def main():
     b = ChessBoard()
@@ -1,8 +1,35 @@
-from chess_piece import Pawn, Rook, Knight, Bishop, Queen, King
+from chess_piece import Pawn, Rook, Knight, Bishop, Queen, King, PAWN, ROOK, KING
 from chess_board import *
 from chess_exception import *
 from typing import Type
 
+# The castles each side can make, by the King's destination: where the King and Rook have to
+# start, where the Rook ends up, the squares between King and Rook that have to be empty, and
+# the squares the King passes through, which can't be under attack, and the castle's bit in
+# ChessBoard.castling_rights.
+CASTLES = {
+        color: {
+            king_to: ( king_from, rook_from, rook_to, BETWEEN[SQUARE_INDEX[king_from]][SQUARE_INDEX[rook_from]], path, right )
+            for king_to, king_from, rook_from, rook_to, path, right in castles }
+        for color, castles in (
+            ( 'light', ( ( 'g1', 'e1', 'h1', 'f1', ( 'f1', 'g1' ), 1 ), ( 'c1', 'e1', 'a1', 'd1', ( 'd1', 'c1' ), 2 ) ) ),
+            ( 'dark',  ( ( 'g8', 'e8', 'h8', 'f8', ( 'f8', 'g8' ), 4 ), ( 'c8', 'e8', 'a8', 'd8', ( 'd8', 'c8' ), 8 ) ) ) ) }
+
+# The rank each color's Pawns promote on, indexed by color id
+PROMOTION_RANK = ( 8, 1 )
+
+# chess_notation imports this module, so its converter can't be imported at the top; it's
+# fetched the first time notation is wanted and kept here so later calls skip the import.
+_NotationConverter = None
+
+def _notation_converter() -> type:
+    """Return the ChessNotationConverter class, importing it only once."""
+    global _NotationConverter
+    if _NotationConverter is None:
+        from chess_notation import ChessNotationConverter
+        _NotationConverter = ChessNotationConverter
+    return _NotationConverter
+
 class ChessMetaMove():
     """An abstract representation of a chess move.  Not to be instantiated directly.
     
@@ -10,6 +37,9 @@ class ChessMetaMove():
     False returns for the sake of allowing for usage withing a game loop without crashing
     the entire program.  I'm instead implementing custom ChessExceptions that the game loop,
     once it is made, can look for specifically."""
+    is_capture = False # Whether the piece has to capture something on the destination
+    __slots__ = ( 'board', 'from_key', 'from_square', 'to_key', 'to_square', 'code', 'piece', 'promotion_type' )
+
     def __init__( self, board: ChessBoard, from_key: str, to_key: str):
         if not isinstance( board, ChessBoard):
             raise TypeError( 'Board must be an instance of ChessBoard.' )
@@ -17,99 +47,131 @@ class ChessMetaMove():
             raise ValueError("from_key and to_key must be valid square keys on the board.")
         if type( self ) == ChessMetaMove:
             raise NotImplementedError( 'ChessMetaMove is an abstract class and must be instantiated via a subclass.' )
+        self._bind( board, from_key, to_key )
+
+    @classmethod
+    def unchecked( cls, board: ChessBoard, from_key: str, to_key: str, promotion: Type[Queen|Rook|Bishop|Knight] = Queen ):
+        """Factory for when the board and keys are known to be good, e. g. they came out of
+        get_legal_moves, which skips the checks __init__ makes.  The move still has to validate()."""
+        move = cls.__new__( cls )
+        move._bind( board, from_key, to_key )
+        move.promotion_type = promotion
+        return move
+
+    def _bind( self, board: ChessBoard, from_key: str, to_key: str ) -> None:
+        """Point the move at its board and squares, and note the piece on the origin."""
         self.board = board
-        self.move_from = {
-            'key':      from_key,
-            'square':   self.board.squares[from_key]
-        }
-        self.move_to = {
-            'key':      to_key,
-            'square':   self.board.squares[to_key]
-        }
+        self.from_key, self.from_square = from_key, board.squares[from_key]
+        self.to_key, self.to_square = to_key, board.squares[to_key]
+        # The move packed into one int: six bits of origin square index, then six of destination
+        self.code = self.from_square.index | self.to_square.index << 6
+        self.piece = self.from_square.contains()
+        self.promotion_type = None # Only ChessMove and ChessCapture can promote
 
     def __eq__( self, other ) -> bool:
         if not isinstance( other, type(self) ):
             return False
+        # Moves in the same game share the one board, so there's no need to compare all of its squares
         return (
-            self.move_from == other.move_from and
-            self.move_to == other.move_to and
-            self.board == other.board
+            self.code == other.code and
+            self.board is other.board
         )
     
     def __hash__( self ) -> int:
-        return hash( ( self.board, self.move_to, self.move_from ) )
+        """Moves between the same two squares hash the same; __eq__ tells the boards apart."""
+        return self.code
     
     @classmethod
     def from_long_notation( cls, board: ChessBoard, notation: str ):
         """Factory to create appropriate Move instance based on long
         move notation, i. e. 'e2e4'."""
-        # Local import to avoid circular dependency issues
-        from chess_notation import ChessNotationConverter as CC
-        converter = CC( board )
+        converter = _notation_converter()( board )
         return converter.create_move_from_long_notation( notation )
 
     def to_notation( self ) -> str:
         """Represent this move in standard algebraic notataion."""
-        # Local import to avoid circular dependency issues
-        from chess_notation import ChessNotationConverter as CC
-        converter = CC( self.board )
-        long_notation = f"{self.move_from['key']}{self.move_to['key']}"
+        converter = _notation_converter()( self.board )
+        long_notation = f"{self.from_key}{self.to_key}"
         return converter.long_to_algebraic( long_notation )
 
     def to_long_notation( self ) -> str:
         """Represent this move in explicit long algebraic notation."""
-        long_notation = f"{self.move_from['key']}{self.move_to['key']}"
+        long_notation = f"{self.from_key}{self.to_key}"
         return long_notation
 
-    def flag_movement( self, piece: Pawn | Rook | King ) -> None:
-        """ Raises the has_moved flag on appropriate ChessPiece objects"""
-        piece.raise_moved_flag()
-
-    def flag_vulnerable( self, piece: Pawn ) -> None:
-        piece.raise_passant_flag()
-
     def validate_origin_constraints( self ) -> bool:
         """Validates constraints for the moving piece and its square."""
-        if self.move_from['square'] == self.move_to['square']:
+        origin = self.from_square
+        if origin == self.to_square:
             # return False
-            raise ChessCannotMoveToOriginSquareException( f'Attempting to move from a square to itself, namely {self.move_from["key"]}.')
+            raise ChessCannotMoveToOriginSquareException( f'Attempting to move from a square to itself, namely {self.from_key}.')
 
-        if not self.move_from['square'].is_occupied:
+        piece = origin.contains()
+        if piece is None:
             # return False
-            raise ChessCannotMoveFromEmptySquareException( f'Attempting to move from empty square at {self.move_from["key"]}.' )
+            raise ChessCannotMoveFromEmptySquareException( f'Attempting to move from empty square at {self.from_key}.' )
             # raise ValueError(f'No piece on {self.from_square} to move.')
 
-        if self.move_from['square'].contains().color != self.board.turn: # type: ignore because we know the color is not None
+        if piece.color != self.board.turn:
             # return False
-            piece = self.move_from['square'].contains()
             raise ChessCannotMoveOutOfTurnException( f'Attempting to move {piece.color} while the ChessBoard sees it to be {self.board.turn}\'s turn.' )
         return True
     
     def validate_other_constraints( self ) -> bool:
         raise NotImplementedError( 'other_constraints need to be defined by a ChessMetaMove subclass.' )
     
+    def outside_pattern( self ) -> ChessException:
+        """The exception to raise when the piece can't get to the destination."""
+        raise NotImplementedError( 'outside_pattern needs to be defined by a ChessMetaMove subclass.' )
+
+    def validate_destination( self, pseudo: bool ) -> bool:
+        """Is the destination one the piece can move to, or capture on if is_capture?  With pseudo,
+        go by how the piece moves and what's in the way, but let pins and checks slide."""
+        if pseudo:
+            reachable = self.board.is_pseudo_legal( self.from_key, self.to_key, self.is_capture )
+        else:
+            reachable = self.board.get_legal_targets( self.from_key, self.is_capture ) >> self.to_square.index & 1
+        if not reachable:
+            # return False
+            raise self.outside_pattern()
+        return True
+
+    def validate_pseudo_movement( self ) -> bool:
+        """Cheap check that the piece could get there at all."""
+        return self.validate_destination( True )
+
     def validate_piece_movement( self ) -> bool:
-        raise NotImplementedError( 'piece_movement needs to be defined by a ChessMetaMove subclass.' )
+        """Validation for the actual move, with chess game rule logic"""
+        return self.validate_destination( False )
     
     def validate_check_rules( self ) -> bool:
         # Discovered checks are handled by ChessBoard.get_legal_(moves|captures).
-        moving_player = self.board.turn
-        passive_player = 'light' if moving_player == 'dark' else 'dark'
-
         # Cannot move a King into check
-        if isinstance( self.move_from['square'].contains(), King ):
-            if self.board.is_in_check_from( self.move_to['square'], passive_player ):
-                return False
+        if self.piece.type_id == KING and self.board.attacked_squares( self.board.opponent ) >> self.to_square.index & 1:
+            return False
         return True
 
+    def pseudo_validate( self ) -> bool:
+        """The cheap half of validate(): whose turn it is, what's on the squares, and whether
+        the piece moves that way, but not whether the move leaves a King in check.  Something
+        trying out lots of moves can weed out most of them with this and only legalize() the
+        ones it settles on."""
+        return (
+            self.validate_origin_constraints() and
+            self.validate_other_constraints() and
+            self.validate_pseudo_movement()
+        )
+
+    def legalize( self ) -> bool:
+        """The expensive half of validate(): everything to do with keeping the King out of check."""
+        return (
+            self.validate_piece_movement() and
+            self.validate_check_rules()
+        )
+
     def validate( self ) -> bool:
         try:
-            return (
-                self.validate_origin_constraints() and
-                self.validate_other_constraints() and
-                self.validate_piece_movement() and 
-                self.validate_check_rules()
-            )
+            return self.pseudo_validate() and self.legalize()
         except ChessException as e:
             raise e
         
@@ -117,14 +179,12 @@ class ChessMetaMove():
         """Promote a pawn to a new piece type."""
         # Validation
         piece = location.contains()
-        if not isinstance( piece, Pawn ):
+        if piece is None or piece.type_id != PAWN:
             raise ValueError( f'Attempting to promote a {piece}, not a Pawn!' ) # TODO Add a ChessException for this
         if location.rank not in ( 1, 8 ):
             raise ValueError( f'Attempting to promote in an invalid location, {location.key}.' ) # TODO Add a ChessException for this
 
-        if not ( isinstance(piece, Pawn ) ) and \
-        ( ( self.move_to['square'].rank == 1 and self.board.turn == 'dark' ) or \
-          ( self.move_to['square'].rank == 8 and self.board.turn == 'light' ) ):
+        if piece.type_id != PAWN or location.rank != PROMOTION_RANK[self.board.turn_id]:
             raise ValueError( f'Attempting to promote a Pawn on the wrong turn- {repr(piece)} on {self.board.turn}\'s turn.' ) # TODO Add a ChessException for this
         # We have a Pawn promotion! Congratulations! 
         match new_type:
@@ -134,7 +194,7 @@ class ChessMetaMove():
                 new_piece = Knight( self.board.turn )
             case x if x is Rook:
                 new_piece = Rook( self.board.turn )
-                self.flag_movement( new_piece )
+                new_piece.raise_moved_flag()
             case x if x is Bishop:
                 new_piece = Bishop( self.board.turn )
             case _:
@@ -143,71 +203,65 @@ class ChessMetaMove():
 
 class ChessMove(ChessMetaMove):
     """Represents a normal, non-capturing chess move."""
-    
+    __slots__ = ()
+
     def __init__(self, board: ChessBoard, from_key: str, to_key: str, promotion: Type[Queen|Rook|Bishop|Knight] = Queen ):
         super().__init__( board, from_key, to_key )
-        self.piece = self.move_from['square'].contains()
         self.promotion_type = promotion
 
     def validate_other_constraints( self ) -> bool:
         """Validates constraints for the destination square."""
-        if self.move_to['square'].is_occupied:
+        blocker = self.to_square.contains()
+        if blocker is not None:
             # return False
-            piece = self.move_from['square'].contains()
-            blocker = self.move_to['square'].contains()
-            raise ChessCannotMoveIntoOccupiedSquareException( f'Attempting to move {piece.name} from {self.move_from["key"]} to {self.move_to["key"]} which is occupied by a {blocker.color} {blocker.name}.' )
+            raise ChessCannotMoveIntoOccupiedSquareException( f'Attempting to move {self.piece.name} from {self.from_key} to {self.to_key} which is occupied by a {blocker.color} {blocker.name}.' )
         return True
 
-    def validate_piece_movement( self ) -> bool:
-        """Validation for the actual move, with chess game rule logic"""
-
-        # Is the destination in the Piece's movement pattern?
-        if self.move_to['square'] not in self.board.get_legal_moves( self.move_from['key'] ):
-            # return False
-            raise ChessCannotMoveOutsideMovementPatternException( f'Attempting to move {self.piece.name} illegally from {self.move_from["key"]} to {self.move_to["key"]}.' ) 
-        # If all of the validation checks pass, return True
-        return True
+    def outside_pattern( self ) -> ChessException:
+        return ChessCannotMoveOutsideMovementPatternException( f'Attempting to move {self.piece.name} illegally from {self.from_key} to {self.to_key}.' )
 
     def execute(self) -> None:
         """Executes the move if it is valid."""
         if self.validate():
-            if isinstance( self.piece, Pawn ) and abs( self.move_from['square'].rank - self.move_to['square'].rank ) == 2:
-                self.flag_vulnerable( self.piece )
-            self.board.move_piece(self.move_from['key'], self.move_to['key'] )
-            if type(self.piece) in ( Pawn, King, Rook ):
-                self.flag_movement( self.piece )
-            if isinstance(self.piece, Pawn ) and \
-            ( ( self.move_to['square'].rank == 8 and self.board.turn == 'light' ) or \
-              ( self.move_to['square'].rank == 1 and self.board.turn == 'dark' ) ):
+            piece, destination = self.piece, self.to_square
+            is_pawn = piece.type_id == PAWN
+            if is_pawn and abs( self.from_square.rank - destination.rank ) == 2:
+                piece.raise_passant_flag()
+            self.board.move_piece(self.from_key, self.to_key )
+            if piece.type_id in ( PAWN, KING, ROOK ): # The pieces that care whether they've moved
+                piece.raise_moved_flag()
+            if is_pawn and destination.rank == PROMOTION_RANK[self.board.turn_id]:
                 # We have a Pawn promotion! Congratulations!
-                new_piece = self.promote( self.move_to['square'] , self.promotion_type )
-                self.board.remove_piece( self.move_to['key'] )
-                self.board.place_piece( new_piece, self.move_to['square'].file, self.move_to['square'].rank )
+                new_piece = self.promote( destination, self.promotion_type )
+                self.board.remove_piece( self.to_key )
+                self.board.place_piece( new_piece, destination.file, destination.rank )
             self.board.end_turn()
 
     def __str__(self):
-        return f"{self.piece.name} moves from {self.move_from['key']} to {self.move_to['key']}" 
+        return f"{self.piece.name} moves from {self.from_key} to {self.to_key}" 
 
     def __repr__(self):
-        return f"ChessMove({self.board}, {self.move_from['key']}, {self.move_to['key']}"
+        return f"ChessMove({self.board}, {self.from_key}, {self.to_key}"
 
 class ChessCapture(ChessMetaMove):
     """Represents a chess capture move."""
+    is_capture = True
+    __slots__ = ()
+
     def __init__(self, board: ChessBoard, from_key: str, to_key: str, promotion: Type[Queen|Rook|Bishop|Knight] = Queen ):
         super().__init__( board, from_key, to_key )
-        self.piece = self.move_from['square'].contains()
         self.promotion_type = promotion
 
 
     def validate_other_constraints(self) -> bool:
         """Validates constraints for the destination square."""
-        if not self.move_to['square'].is_occupied:
+        blocker = self.to_square.contains()
+        if blocker is None:
             # return False
-            raise ChessCannotCaptureIntoEmptySquareException( f'Cannot capture from empty square at {self.move_to["key"]}.' )
-        if self.move_to['square'].contains().color == self.piece.color: # type: ignore because we know the colors are not None
+            raise ChessCannotCaptureIntoEmptySquareException( f'Cannot capture from empty square at {self.to_key}.' )
+        if blocker.color == self.piece.color: # type: ignore because we know the colors are not None
             # return False
-            blocker = self.move_to['square'].contains()
-            raise ChessCannotCaptureFriendlyPieceException( f'Cannot capture friendly {blocker.color} {blocker.name} at {self.move_to["key"]}.' )
+            raise ChessCannotCaptureFriendlyPieceException( f'Cannot capture friendly {blocker.color} {blocker.name} at {self.to_key}.' )
         return True
 
     def validate_is_successful_en_passant( self, capturing_piece: Pawn, captured_piece: ChessPiece ) -> bool:
@@ -217,170 +271,138 @@ class ChessCapture(ChessMetaMove):
         don't want to throw Exceptions until this is broken into separate identification (which will not throw) and validation
         (which will).  For now, continue to return False but I have the exceptions here ready for when the logic flow is ready."""
         # Both pieces must be Pawns:
-        if not all( ( isinstance(capturing_piece, Pawn), isinstance(captured_piece, Pawn) ) ):
-            blocker = self.move_to['square'].contains()
-            # raise ChessCannotCaptureNonPawnEnPassantException( f'A {self.piece.name} cannot capture a {blocker.name} en passant.' )
+        if capturing_piece.type_id != PAWN or captured_piece.type_id != PAWN:
+            # raise ChessCannotCaptureNonPawnEnPassantException( f'A {capturing_piece.name} cannot capture a {captured_piece.name} en passant.' )
             return False
-        # The capture must be one file away and the same rank:
-        if abs(ord(self.move_from['square'].file) - ord(self.move_to['square'].file)) != 1 or self.move_from['square'].rank != self.move_to['square'].rank:
-            # raise ChessCannotCaptureEnPassantRemotelyException( f'Cannot capture en-passant from {self.move_from["key"]} to {self.move_to["key"]}.' )
+        # The capture must be one file away and the same rank, which is just arithmetic on the square indices:
+        from_index, to_index = self.from_square.index, self.to_square.index
+        if abs( ( from_index & 7 ) - ( to_index & 7 ) ) != 1 or from_index >> 3 != to_index >> 3:
+            # raise ChessCannotCaptureEnPassantRemotelyException( f'Cannot capture en-passant from {self.from_key} to {self.to_key}.' )
             return False
         # The captured Pawn must have just moved two squares forward:
         if not captured_piece.vulnerable:
             # raise ChessCannotCaptureEnPassantWhenNotVulnerableException ( 'Target of en passant capture is not vulnerable.' )
             return False
         # The space behind the captured Pawn must be empty:
-        final_rank = self.move_to['square'].rank + capturing_piece.direction # type: ignore
-        final_square_key = f"{self.move_to['square'].file}{final_rank}"
-        if self.board.squares[final_square_key].is_occupied:
-            blocker = self.board[final_square_key].contains()
-            # raise ChessCannotCaptureEnPassantWhenFinalSquareNotEmptyException( f'Somehow a {blocker.name} is occupying destination square {final_square_key}.' )
+        final_square = self.en_passant_final_square()
+        blocker = final_square.contains()
+        if blocker is not None:
+            # raise ChessCannotCaptureEnPassantWhenFinalSquareNotEmptyException( f'Somehow a {blocker.name} is occupying destination square {final_square.key}.' )
             return False
         # If all checks pass, return True
         return True
 
     def en_passant_final_square( self ) -> Square:
         """Returns the final square for an en passant capture."""
-        final_rank = self.move_to['square'].rank + self.move_from['square'].contains().direction
-        final_square_key = f"{self.move_to['square'].file}{final_rank}"
-        return self.board.squares[final_square_key]
+        return self.board.square_list[self.to_square.index + 8 * self.piece.direction]
 
     def execute(self) -> Optional[ChessPiece]:
         """Executes the move if it is valid."""
         if self.validate():
-            capturing_piece = self.move_from['square'].contains()
-            captured_piece = self.move_to['square'].contains()
-            if isinstance( capturing_piece, Pawn ) and isinstance( captured_piece, Pawn ) and \
-                    self.move_from['square'].rank == self.move_to['square'].rank: # This is a lateral move, presumptively this is en-passant
-                if self.validate_is_successful_en_passant( capturing_piece, captured_piece ):
-                    # En-passant capture
-                    self.board.remove_piece( self.move_to['key'] )  # Remove the captured piece
-                    final_square = self.en_passant_final_square()
-                    self.board.move_piece( self.move_from['key'], final_square.key )
-                    self.flag_movement( final_square.contains() ) # type: ignore because we know the piece is
+            origin, destination = self.from_square, self.to_square
+            capturing_piece = origin.contains()
+            captured_piece = destination.contains()
+            if capturing_piece.type_id == PAWN and origin.rank == destination.rank:
+                # A lateral Pawn capture is en-passant.  validate() only lets one through if it's in
+                # get_legal_captures, which already checked everything validate_is_successful_en_passant
+                # would (a vulnerable Pawn next door with an empty square behind it), so just do it.
+                self.board.remove_piece( self.to_key )  # Remove the captured piece
+                final_square = self.en_passant_final_square()
+                self.board.move_piece( self.from_key, final_square.key )
+                capturing_piece.raise_moved_flag() # type: ignore because we know the piece is
             else:
                 # Regular capture
-                self.board.remove_piece( self.move_to['key'] )  # Remove the captured piece
-                self.board.move_piece(self.move_from['key'], self.move_to['key'])
-                self.flag_movement( self.piece ) # type: ignore because we know the piece is)
-                # self.move_to['square'].occupant.raise_moved_flag() # type: ignore because we know the piece is not None
-            if isinstance(self.piece, Pawn ) and \
-            ( ( self.move_to['square'].rank == 8 and self.board.turn == 'light' ) or \
-              ( self.move_to['square'].rank == 1 and self.board.turn == 'dark' ) ):
+                self.board.remove_piece( self.to_key )  # Remove the captured piece
+                self.board.move_piece(self.from_key, self.to_key)
+                self.piece.raise_moved_flag() # type: ignore because we know the piece is)
+                # self.to_square.occupant.raise_moved_flag() # type: ignore because we know the piece is not None
+            if self.piece.type_id == PAWN and destination.rank == PROMOTION_RANK[self.board.turn_id]:
                 # We have a Pawn promotion! Congratulations!
-                new_piece = self.promote( self.move_to['square'] , self.promotion_type )
-                self.board.remove_piece( self.move_to['key'] )
-                self.board.place_piece( new_piece, self.move_to['square'].file, self.move_to['square'].rank )
+                new_piece = self.promote( destination, self.promotion_type )
+                self.board.remove_piece( self.to_key )
+                self.board.place_piece( new_piece, destination.file, destination.rank )
             self.board.end_turn()
             return captured_piece
         else:
             return None
 
-    def validate_piece_movement( self ) -> bool:
-        """Validation for the actual capture, with chess game rule logic"""
-        moving_player = self.board.turn
-        passive_player = 'light' if moving_player == 'dark' else 'dark'
-        # Is the destination in the Piece's capture pattern?
-        if self.move_to['square'] not in self.board.get_legal_captures( self.move_from['key'] ):
-            # return False
-            raise ChessCannotCaptureOutsideCapturePatternException ( f'Attempting to capture with {self.piece.name} illegally from {self.move_from["key"]} to {self.move_to["key"]}. {repr(self)}' ) 
-        # If all of the validation checks pass, return True
-        return True
-    
+    def outside_pattern( self ) -> ChessException:
+        return ChessCannotCaptureOutsideCapturePatternException ( f'Attempting to capture with {self.piece.name} illegally from {self.from_key} to {self.to_key}. {repr(self)}' )
+
     def __str__(self):
-        return f"{self.piece.name} takes from {self.move_from['key']} to {self.move_to['key']}" 
+        return f"{self.piece.name} takes from {self.from_key} to {self.to_key}" 
     
     def __repr__(self):
-        return f"ChessCapture({self.board}, {self.move_from['key']}, {self.move_to['key']}"
+        return f"ChessCapture({self.board}, {self.from_key}, {self.to_key}"
 
 
 class ChessCastle(ChessMetaMove):
     """Represents a chess castling move."""
-    def __init__(self, board: ChessBoard, from_key: str, to_key: str ):
-        super().__init__( board, from_key, to_key )
-        self.piece = self.move_from['square'].contains()
+    __slots__ = ()
 
     def validate_other_constraints(self) -> bool:
-        if not isinstance( self.piece, King ):
+        board, king = self.board, self.piece
+        if king.type_id != KING:
             # return False
-            raise ChessCannotCastleWithNonKingException ( f'Attempting to castle but we need a King, not a {self.piece.name}.' )
+            raise ChessCannotCastleWithNonKingException ( f'Attempting to castle but we need a King, not a {king.name}.' )
 
-        if self.piece.has_moved:
+        if king.has_moved:
             # return False
             raise ChessCannotCastleIfKingHasMovedException
 
-        if self.piece.has_been_in_check: # type: ignore because we know the piece is a King
+        if king.has_been_in_check: # type: ignore because we know the piece is a King
             # return False
             raise ChessCannotCastleIfKingHasBeenInCheckException
 
-        if self.board.is_in_check_from( self.move_from['square'], 'light' if self.board.turn == 'dark' else 'dark' ):
+        castles = CASTLES[board.turn]
+        if self.to_key not in castles:
             # return False
-            raise ChessCannotCastleOutOfCheckException
-
-        if self.board.turn == 'light':
-            if self.move_to['key'] not in ['g1', 'c1']:
-                # return False
-                raise ChessCannotCastleIntoInvalidDestinationException( f'Attempting illegal castle from {self.move_from["key"]} to {self.move_to["key"]}.' )
-            if self.move_from['key'] != 'e1':
-                # return False
-                raise ChessCannotCastleIntoInvalidDestinationException( f'Attempting illegal castle from {self.move_from["key"]} to {self.move_to["key"]}.' )
-            if self.move_to['key'] == 'g1':
-                if self.board['f1'].is_occupied:
-                    # return False
-                    raise ChessCannotCastleThroughOccupiedSquaresException( 'Cannot castle through occupied square f1.' )
-                rook_key = 'h1'
-            elif self.move_to['key'] == 'c1':
-                if any( ( self.board['b1'].is_occupied, self.board['c1'].is_occupied, self.board['d1'].is_occupied ) ):
-                    # return False
-                    raise ChessCannotCastleThroughOccupiedSquaresException( 'Cannot castle through occupied squares b1, c1.' )
-                rook_key = 'a1'
-        else:
-            if self.move_to['key'] not in ['g8', 'c8']:
-                # return False
-                raise ChessCannotCastleIntoInvalidDestinationException( f'Attempting illegal castle from {self.move_from["key"]} to {self.move_to["key"]}.' )
-            if self.move_from['key'] != 'e8':
+            raise ChessCannotCastleIntoInvalidDestinationException( f'Attempting illegal castle from {self.from_key} to {self.to_key}.' )
+        king_key, rook_key, _, between, path, right = castles[self.to_key]
+        if self.from_key != king_key:
+            # return False
+            raise ChessCannotCastleIntoInvalidDestinationException( f'Attempting illegal castle from {self.from_key} to {self.to_key}.' )
+
+        # The board's castling rights already say whether this King and Rook are both home and
+        # unmoved, so a castle whose right is gone is turned away with one &, before any attack
+        # lookups.  The King's flags were checked above, so it's the Rook's fault; say how.
+        if not board.castling_rights & right:
+            rook = board[rook_key].contains()
+            if rook is None or rook.type_id != ROOK or rook.color != king.color:
                 # return False
-                raise ChessCannotCastleIntoInvalidDestinationException( f'Attempting illegal castle from {self.move_from["key"]} to {self.move_to["key"]}.' )
-            if self.move_to['key'] == 'g8':
-                if self.board['f8'].is_occupied:
-                    # return False
-                    raise ChessCannotCastleThroughOccupiedSquaresException( 'Cannot castle through occupied square f8.' )
-                rook_key = 'h8'
-            elif self.move_to['key'] == 'c8':
-                if any( ( self.board['b8'].is_occupied, self.board['c8'].is_occupied, self.board['d8'].is_occupied ) ):
-                    # return False
-                    raise ChessCannotCastleThroughOccupiedSquaresException( 'Cannot castle through occupied squares b8, b8.' )
-                rook_key = 'a8'
-
-        # Validate the Rook has not moved and that the piece in the Rook's spot is indeed a Rook:
-        rook = self.board[rook_key].contains() # pyright: ignore[reportPossiblyUnboundVariable]
-        if not isinstance(rook, Rook):
+                raise ChessCannotCastleWithoutRookException( f'Cannot castle to {rook_key} as there is no rook there.' )
+            # return False
+            raise ChessCannotCastleIfRookHasMovedException( f'Cannot castle as root at {rook_key} has already moved.' )
+
+        # Now see what the opponent attacks.  The map is cached per position, and the path squares
+        # below are read off the same one.  Being in check is reported ahead of blocked squares.
+        attacked = board.attacked_squares( board.opponent )
+        if attacked >> self.from_square.index & 1:
             # return False
-            raise ChessCannotCastleWithoutRookException( f'Cannot castle to {rook_key} as there is no rook there.' ) # pyright: ignore[reportPossiblyUnboundVariable]
-        if rook.has_moved:
+            raise ChessCannotCastleOutOfCheckException
+
+        # Everything between the King and the Rook has to be empty, which is one look at the board's occupancy
+        blockers = board.occ_all & between
+        if blockers:
             # return False
-            raise ChessCannotCastleIfRookHasMovedException( f'Cannot castle as root at {rook_key} has already moved.' ) # pyright: ignore[reportPossiblyUnboundVariable]
+            occupied = ', '.join( SQUARE_KEYS[index] for index in iter_bits( blockers ) )
+            raise ChessCannotCastleThroughOccupiedSquaresException( f'Cannot castle through occupied squares {occupied}.' )
 
         # TODO: check if the squares the King moves through are not under attack.
         # Verify this works properly.
-        match self.move_to['key']: # We're probably double-checking that the King is not moving into check because of the base class validation.  Maybe move g1/c1/g8/c8 from these Lists?
-            case 'g1':
-                path = ['f1', 'g1']
-            case 'c1':
-                path = ['d1', 'c1']
-            case 'g8':
-                path = ['f8', 'g8']
-            case 'c8':
-                path = ['d8', 'c8']
-        for square_key in path: # pyright: ignore[reportPossiblyUnboundVariable]
-            square = self.board[square_key]
-            if self.board.is_in_check_from( square, 'light' if self.board.turn == 'dark' else 'dark' ):
+        # We're probably double-checking that the King is not moving into check because of the base class validation.
+        for square_key in path:
+            if attacked >> SQUARE_INDEX[square_key] & 1:
                 # return False
                 raise ChessCannotCastleIntoCheckException( f'Cannot castle into {square_key} which is in check.' )
 
         # If all checks pass, return True
         return True
 
+    def validate_pseudo_movement( self ) -> bool:
+        """See validate_piece_movement."""
+        return True
+
     def validate_piece_movement( self ) -> bool:
         """Validation for the actual castling move, with chess game rule logic."""
         # Castling is a special move, so we don't need to check the piece's movement pattern.
@@ -390,22 +412,19 @@ class ChessCastle(ChessMetaMove):
     def execute(self) -> None:
         """Executes the castling move if it is valid."""
         if self.validate():
-            king = self.move_from['square'].remove()
-            if king.color == 'light':
-                rook_key = 'h1' if self.move_to['key'] == 'g1' else 'a1'
-                rook_to_key = 'f1' if self.move_to['key'] == 'g1' else 'd1'
-            else:
-                rook_key = 'h8' if self.move_to['key'] == 'g8' else 'a8'
-                rook_to_key = 'f8' if self.move_to['key'] == 'g8' else 'd8'
-            rook = self.board[rook_key].remove()
+            board = self.board
+            king = self.from_square.remove()
+            _, rook_key, rook_to_key, _, _, _ = CASTLES[king.color][self.to_key]
+            rook = board[rook_key].remove()
 
-            # Place the King and Rook in their new positions
-            self.board.place_piece(king, self.move_to['square'].file, self.move_to['square'].rank ) # type: ignore (suppress Pylance warning for type we know is not None)
-            self.board.place_piece(rook, rook_to_key[0], int(rook_to_key[1]) )
+            # Place the King and Rook in their new positions; the table already gave us valid
+            # squares, so there's no need to go back through place_piece's key building and checks
+            self.to_square.place( king ) # type: ignore (suppress Pylance warning for type we know is not None)
+            board[rook_to_key].place( rook )
 
             # Mark the King and Rook as having moved
-            self.flag_movement( king )
-            self.flag_movement( rook ) # type: ignore since we know it's a Rook by now
+            king.raise_moved_flag()
+            rook.raise_moved_flag() # type: ignore since we know it's a Rook by now
 
             self.board.end_turn()
         else:
@@ -413,7 +432,7 @@ class ChessCastle(ChessMetaMove):
             # raise ValueError("Invalid castling move.")
 
     def __str__(self):
-        return f"{self.piece.name} castles from {self.move_from['key']} to {self.move_to['key']}" 
+        return f"{self.piece.name} castles from {self.from_key} to {self.to_key}" 
     
     def __repr__(self):
-        return f"ChessCastle({self.board}, {self.move_from['key']}, {self.move_to['key']}"
+        return f"ChessCastle({self.board}, {self.from_key}, {self.to_key}"
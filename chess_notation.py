@@ -1,13 +1,44 @@
 from chess_piece import *
 from chess_board import ChessBoard, Square
+from bitboard import SQUARE_KEYS, iter_bits
 from chess_move import ChessMove, ChessCapture, ChessCastle, ChessMetaMove as CM
 from typing import Optional, Union
+from collections import OrderedDict
 from chess_exception import *
-import re
+
+# Castling moves, by the King's from and to squares
+CASTLING_MOVES = {
+    ('e1', 'g1'): 'O-O',    # White kingside
+    ('e1', 'c1'): 'O-O-O',  # White queenside
+    ('e8', 'g8'): 'O-O',    # Black kingside
+    ('e8', 'c8'): 'O-O-O'   # Black queenside
+}
+CASTLING_KING_STARTS = frozenset(('e1', 'e8'))
+
+# The piece types, by their notation symbol (Pawns have none)
+PIECE_SYMBOLS = {piece_type.symbol: piece_type for piece_type in (King, Queen, Rook, Bishop, Knight)}
+# ... and the ones a Pawn can promote into
+PROMOTION_SYMBOLS = {piece_type.symbol: piece_type for piece_type in (Queen, Rook, Bishop, Knight)}
 
 class ChessNotationConverter:
     """Converts between long algebraic notation and standard algebraic notation"""
 
+    # Conversions already worked out, each way, shared by every converter since ChessMove.to_notation
+    # makes a new one each time, and how many of each to remember before forgetting the least
+    # recently used.  A hit moves its entry to the end, so e. g. the opening moves of every game a
+    # PGN replay goes through stay remembered while one-off positions age out.
+    # The board's hash does NOT cover everything a conversion can depend on (Pawns' has_moved is
+    # left out), so each cache's key has to account for whatever its own conversion looks at.
+    #
+    # long_to_algebraic gets away with the hash alone: the moving piece is given by its square,
+    # Pawns never get disambiguated by what other Pawns can reach, and has_moved doesn't change
+    # where anything else can go.  Anything new it looks at needs adding to the key.
+    _algebraic_cache = OrderedDict()
+    # The board's hash leaves out which Pawns have moved, and that decides which Pawn (if any)
+    # can step two squares to the destination, so these are keyed on the moved Pawns as well.
+    _long_cache = OrderedDict()
+    CACHE_SIZE = 4096
+
     def __init__(self, board: ChessBoard):
         self.board = board
 
@@ -15,26 +46,38 @@ class ChessNotationConverter:
         """Convert long notation (e.g., 'e2e4', 'b1c3') to algebraic notation (e.g., 'e4', 'Nc3')
 
         Also handles extended long notation like 'f4xg5' by parsing it appropriately.
-        """
+
+        The answer is remembered under the board's Zobrist hash, the notation, and the promotion
+        piece, so replaying or redrawing the same moves skips the disambiguation work.  The hash
+        leaves out Pawns' has_moved, which is only safe because nothing here depends on it; see
+        the comment on _algebraic_cache."""
+        cache_key = (hash(self.board), long_notation, getattr(self, 'promotion_piece', None))
+        cache = self._algebraic_cache
+        algebraic = self._recall(cache, cache_key)
+        if algebraic is None:
+            algebraic = self._long_to_algebraic(long_notation)
+            self._remember(cache, cache_key, algebraic)
+        return algebraic
+
+    def _recall(self, cache: OrderedDict, cache_key: tuple) -> Optional[str]:
+        """Look up a conversion, marking it as the most recently used, or None if it isn't there."""
+        notation = cache.get(cache_key)
+        if notation is not None:
+            cache.move_to_end(cache_key)
+        return notation
+
+    def _remember(self, cache: OrderedDict, cache_key: tuple, notation: str) -> None:
+        """Store a conversion, making room first by forgetting the least recently used if the cache is full."""
+        if len(cache) >= self.CACHE_SIZE:
+            cache.popitem(last=False)
+        cache[cache_key] = notation
+
+    def _long_to_algebraic(self, long_notation: str) -> str:
+        """long_to_algebraic without the cache."""
         # Clean and parse the input
         clean_notation = long_notation.replace(' ', '').lower()
 
-        # Handle extended long notation (e.g., 'f4xg5')
-        if 'x' in clean_notation:
-            parts = clean_notation.split('x')
-            if len(parts) == 2:
-                from_square = parts[0]
-                to_square = parts[1]
-                is_capture_notation = True
-            else:
-                raise ValueError(f"Invalid capture notation: {long_notation}")
-        else:
-            # Standard long notation (e.g., 'e2e4')
-            if len(clean_notation) != 4:
-                raise ValueError(f"Invalid long notation: {long_notation}. Expected format like 'e2e4'")
-            from_square = clean_notation[:2]
-            to_square = clean_notation[2:]
-            is_capture_notation = False
+        from_square, to_square = self._split_long_notation(clean_notation, long_notation)
 
         # Validate squares exist
         if from_square not in self.board.squares or to_square not in self.board.squares:
@@ -61,30 +104,35 @@ class ChessNotationConverter:
         #    if file_diff == 1:  # Diagonal move to empty square = en passant
         #        is_actual_capture = True
 
-        # Build the notation
-        notation_parts = []
-
-        # Add piece symbol (empty for pawns)
-        notation_parts.append(piece.symbol)
+        # By far the commonest move is a plain Pawn push, and its notation is just the destination:
+        # no symbol, no disambiguation, no capture marker.  Only a promotion needs anything more.
+        if (piece.type_id == PAWN and not is_actual_capture and from_square[0] == to_square[0] and
+                not self._is_promotion(piece, self.board[to_square])):
+            return to_square
 
-        # Add disambiguation if needed
+        # Build the notation: piece symbol (empty for pawns), disambiguation if needed, capture
+        # marker, destination square, and promotion, all in one go
         disambiguation = self._get_disambiguation(piece, from_square, to_square, is_actual_capture)
-        notation_parts.append(disambiguation)
-
-        # Add capture marker
-        if is_actual_capture:
-            notation_parts.append('x')
-
-        # Add destination square
-        notation_parts.append(to_square)
+        capture = 'x' if is_actual_capture else ''
 
         # DONE: Add promotion notation (=Q, =R, etc.) when promotion is implemented
         # TODO: Add check (+) and checkmate (#) indicators
 
-        if self._is_promotion( piece, self.board[to_square] ):
-            notation_parts.append( '=' + self.promotion_piece.symbol )
+        promotion = '=' + self.promotion_piece.symbol if self._is_promotion( piece, self.board[to_square] ) else ''
+
+        return f'{piece.symbol}{disambiguation}{capture}{to_square}{promotion}'
 
-        return ''.join(notation_parts)
+    def _split_long_notation(self, clean_notation: str, long_notation: str) -> tuple[str, str]:
+        """Split cleaned long notation into its from and to square keys.  There are only two
+        shapes it comes in, so just slice: 'e2e4' is four characters, and the extended form
+        'f4xg5' is five with the 'x' in the middle."""
+        if len(clean_notation) == 4:
+            return clean_notation[:2], clean_notation[2:]
+        if len(clean_notation) == 5 and clean_notation[2] == 'x':
+            return clean_notation[:2], clean_notation[3:]
+        if 'x' in clean_notation:
+            raise ValueError(f"Invalid capture notation: {long_notation}")
+        raise ValueError(f"Invalid long notation: {long_notation}. Expected format like 'e2e4'")
 
     def _is_promotion( self, piece: ChessPiece, to_square: Square ) -> bool:
         """Infers if a move  represents pawn promotion based on piece type and final location"""
@@ -94,17 +142,10 @@ class ChessNotationConverter:
     def _check_castling(self, from_square: str, to_square: str) -> Optional[str]:
         """Check if this move represents castling and return appropriate notation"""
         # Only check castling for king moves from starting positions
-        if from_square not in ['e1', 'e8']:
+        if from_square not in CASTLING_KING_STARTS:
             return None
 
-        castling_moves = {
-            ('e1', 'g1'): 'O-O',    # White kingside
-            ('e1', 'c1'): 'O-O-O',  # White queenside
-            ('e8', 'g8'): 'O-O',    # Black kingside
-            ('e8', 'c8'): 'O-O-O'   # Black queenside
-        }
-
-        return castling_moves.get((from_square, to_square))
+        return CASTLING_MOVES.get((from_square, to_square))
 
     def _get_disambiguation(self, piece: ChessPiece, from_square: str, to_square: str, is_capture: bool) -> str:
         """Determine if disambiguation is needed and return appropriate notation"""
@@ -125,25 +166,24 @@ class ChessNotationConverter:
         """Find other pieces of the same type that can also reach the destination"""
         ambiguous_squares = []
 
-        for square_key, square in self.board.squares.items():
+        # The board's bitboard for this kind of piece already says where they all are
+        for square_key in self._squares_holding(piece.type_id, piece.color_id):
             if square_key == from_square:
                 continue
 
-            other_piece = square.contains()
-            if (other_piece and
-                type(other_piece) == type(piece) and
-                other_piece.color == piece.color):
-
-                # Check if this piece can legally move to the destination
-                legal_moves = self.board.get_legal_moves(square_key)
-                legal_captures = self.board.get_legal_captures(square_key)
-
-                target_square = self.board.squares[to_square]
-                if target_square in legal_moves or target_square in legal_captures:
-                    ambiguous_squares.append(square_key)
+            # Check if this piece can legally move to the destination
+            if self.board.can_reach(square_key, to_square):
+                ambiguous_squares.append(square_key)
 
         return ambiguous_squares
 
+    def _squares_holding(self, type_id: int, color_id: int) -> list[str]:
+        """The keys of the squares holding the given color's pieces of the given type, read off
+        the board's bitboard rather than by looking at all 64 squares.  They come back in the
+        order board.squares lists them (a1, a2, ... h8) so ambiguity is resolved as it always was."""
+        indices = sorted(iter_bits(self.board.bb[color_id * 6 + type_id]), key=lambda index: (index & 7, index >> 3))
+        return [SQUARE_KEYS[index] for index in indices]
+
     def _resolve_ambiguity(self, from_square: str, ambiguous_squares: list[str]) -> str:
         """Determine the minimum disambiguation needed"""
         from_file = from_square[0]
@@ -163,7 +203,30 @@ class ChessNotationConverter:
         return from_square
 
     def algebraic_to_long(self, algebraic_notation: str) -> str:
-        """Convert algebraic notation back to long notation"""
+        """Convert algebraic notation back to long notation
+
+        Like long_to_algebraic, the answer is remembered under the board's hash (along with the
+        side to move's moved Pawns, which the hash doesn't cover), so replaying the same game
+        (e. g. importing it again) skips the search for the moving piece."""
+        cache_key = (hash(self.board), algebraic_notation, self._moved_pawns())
+        cache = self._long_cache
+        long_notation = self._recall(cache, cache_key)
+        if long_notation is None:
+            long_notation = self._algebraic_to_long(algebraic_notation)
+            self._remember(cache, cache_key, long_notation)
+        return long_notation
+
+    def _moved_pawns(self) -> int:
+        """Bitboard of the side to move's Pawns that have already moved, and so can't step two squares."""
+        board = self.board
+        moved = 0
+        for index in iter_bits(board.bb[board.turn_id * 6 + PAWN]):
+            if board.square_list[index].occupant.has_moved:
+                moved |= 1 << index
+        return moved
+
+    def _algebraic_to_long(self, algebraic_notation: str) -> str:
+        """algebraic_to_long without the cache."""
         # Handle castling
         if algebraic_notation in ['O-O', '0-0']:
             return 'e1g1' if self.board.turn == 'light' else 'e8g8'
@@ -171,7 +234,7 @@ class ChessNotationConverter:
             return 'e1c1' if self.board.turn == 'light' else 'e8c8'
 
         # Parse the algebraic notation
-        notation = algebraic_notation.replace('+', '').replace('#', '')  # Remove check/mate indicators
+        notation = algebraic_notation.rstrip('+#')  # Remove check/mate indicators, which only ever come last
 
         # Extract components
         is_capture = 'x' in notation
@@ -190,10 +253,7 @@ class ChessNotationConverter:
             piece_type = Pawn
         else:
             piece_symbol = piece_part[0].upper()
-            piece_type = {
-                'K': King, 'Q': Queen, 'R': Rook,
-                'B': Bishop, 'N': Knight
-            }[piece_symbol]
+            piece_type = PIECE_SYMBOLS[piece_symbol]
 
         # Find the source square
         source_square = self._find_source_square(piece_type, piece_part, destination, is_capture)
@@ -205,21 +265,10 @@ class ChessNotationConverter:
         candidates = []
 
         # Find all pieces of the correct type that can reach the destination
-        for square_key, square in self.board.squares.items():
-            piece = square.contains()
-            if (piece and
-                type(piece) == piece_type and
-                piece.color == self.board.turn):
-
-                # Check if this piece can legally reach the destination
-                legal_moves = self.board.get_legal_moves(square_key)
-                legal_captures = self.board.get_legal_captures(square_key)
-
-                target_square = self.board.squares[destination]
-                can_reach = target_square in legal_moves or target_square in legal_captures
-
-                if can_reach:
-                    candidates.append(square_key)
+        for square_key in self._squares_holding(piece_type.type_id, self.board.turn_id):
+            # Check if this piece can legally reach the destination
+            if self.board.can_reach(square_key, destination):
+                candidates.append(square_key)
 
         if not candidates:
             raise ValueError(f"No {piece_type.__name__} can reach {destination}")
@@ -244,32 +293,14 @@ class ChessNotationConverter:
         self.promotion_piece = Queen  # default promotion piece type
         if '=' in clean_notation:
             main_part, promotion_part = clean_notation.split('=')
-            symbol_map = {
-                Queen.symbol: Queen,
-                Rook.symbol: Rook,
-                Bishop.symbol: Bishop,
-                Knight.symbol: Knight
-            }
-            if promotion_part.upper() in symbol_map:
-                self.promotion_piece = symbol_map[promotion_part]
+            promotion_symbol = promotion_part.upper()
+            if promotion_symbol in PROMOTION_SYMBOLS:
+                self.promotion_piece = PROMOTION_SYMBOLS[promotion_symbol]
             else:
                 raise ValueError( f'Attempting to promote into unknown piece: {promotion_part=}.' )
             clean_notation = main_part
 
-        # Handle extended long notation (e.g., 'f4xg5')
-        if 'x' in clean_notation:
-            parts = clean_notation.split('x')
-            if len(parts) == 2:
-                from_square = parts[0]
-                to_square = parts[1]
-            else:
-                raise ValueError(f"Invalid capture notation: {long_notation}")
-        else:
-            # Standard long notation (e.g., 'e2e4')
-            if len(clean_notation) != 4:
-                raise ValueError(f"Invalid long notation: {long_notation}. Expected format like 'e2e4'")
-            from_square = clean_notation[:2]
-            to_square = clean_notation[2:]
+        from_square, to_square = self._split_long_notation(clean_notation, long_notation)
 
         # Validate squares exist
         if from_square not in self.board.squares or to_square not in self.board.squares:
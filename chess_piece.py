@@ -1,6 +1,11 @@
 from abc import ABC, abstractmethod
 from typing import Optional
 from copy import deepcopy
+from bitboard import COLOR_INDEX, KNIGHT_STEPS, KING_STEPS
+
+# Integer piece types, for indexing tables rather than asking isinstance() in the hot paths.
+# The order also fixes each type's slot within a color's block of six bitboards.
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range( 6 )
 
 class ChessPiece(ABC):
     """It should be noted that because we're (trying to) use the Unicode
@@ -16,6 +21,18 @@ class ChessPiece(ABC):
             'light' : '¡',
             'dark'  : '!' }
     symbol = 'X' # For usage in move notation; should be overridden by subclass
+    type_id = -1 # One of PAWN through KING; should be overridden by subclass
+    move_pattern = () # The ( file_offset, rank_offset ) directions; built once per subclass, not per call
+
+    # No per-instance __dict__; subclasses list just the flags they add on top of these
+    __slots__ = ( 'color', 'color_id', 'piece_id', 'name', 'direction' )
+
+    def __new__( cls, *args, **kwargs ):
+        """Refuse to make a bare ChessPiece.  ABC would refuse too, but with a TypeError about
+        abstract methods; this says what's actually wrong, before anything is allocated."""
+        if cls is ChessPiece:
+            raise NotImplementedError("ChessPiece should not be instantiated directly")
+        return super().__new__( cls )
 
     def __init__(self, color: Optional[str] = None ):
         """Meant to be superceded by a subclass for each type of piece."""
@@ -24,13 +41,14 @@ class ChessPiece(ABC):
         elif color not in [ 'light', 'dark' ]:
             raise ValueError( f"Color must be either 'light' or 'dark'.  {color=}." )
         self.color = color
-        if type(self) == ChessPiece:
-            raise NotImplementedError("ChessPiece should not be instantiated directly")
+        self.color_id = COLOR_INDEX[color] # 0 for light, 1 for dark, for indexing and quick comparisons
         self.name = self.__class__.__name__.lower() # e. g. a Knight instance's name will be 'knight'
+        # One small int per kind of piece (color and type), which is also its bitboard's slot on the board
+        self.piece_id = self.color_id * 6 + self.type_id
         self.direction = 0 # Only Pawns use this, setting it to ±1 depending on color
 
     def __str__( self ):
-        return self.__class__.glyph[self.color]
+        return GLYPHS[self.piece_id]
 
     def __repr__( self ) -> str:
         """Return e. g. 'Rook ( "light" )'."""
@@ -39,17 +57,17 @@ class ChessPiece(ABC):
     def __eq__( self, other_piece ) -> bool:
         """Allow for such things as `if some_chess_piece in{ Rook('light'), Queen('dark') }:` """
         if isinstance( other_piece, ChessPiece ):
-            return all( [ self.color == other_piece.color, self.name == other_piece.name ] )
+            return self.piece_id == other_piece.piece_id
         else:
             # It's not even a ChessPiece, so it's oviously not equal
             return False
 
     def __hash__( self ) -> int:
-        return hash( ( self.color, self.name ) )
+        return self.piece_id
 
     @abstractmethod
-    def get_move_pattern( self ) -> list[ tuple[ int, int ] ]:
-        """Returns a list of (file_offset, rank_offset) tuples for valid movement pattern.
+    def get_move_pattern( self ) -> tuple[ tuple[ int, int ], ... ]:
+        """Returns a tuple of (file_offset, rank_offset) tuples for valid movement pattern.
 
         Positive file_offset means moving toward 'h'; negative toward 'a'.
         Positive rank_offset means moving toward 8; negative toward 1.
@@ -57,8 +75,8 @@ class ChessPiece(ABC):
         These are _relative_ movement directions."""
         # raise NotImplementedError( 'Must be implemented by ChessPiece subclasses.' )
 
-    def get_capture_pattern( self ) -> list[ tuple[ int, int ] ]:
-        """Returns a list of (file_offset, rank_offset) tuples for valid capture / attack locations.
+    def get_capture_pattern( self ) -> tuple[ tuple[ int, int ], ... ]:
+        """Returns a tuple of (file_offset, rank_offset) tuples for valid capture / attack locations.
 
         For most pieces this is identical to the movement pattern; pawns are, shall we say, Special."""
         return self.get_move_pattern()
@@ -73,46 +91,32 @@ class ChessPiece(ABC):
     @property
     def is_vulnerable( self ) -> bool:
         """Return True if the piece is vulnerable to en passant capture."""
-        if hasattr( self, 'vulnerable' ):
-            return self.vulnerable
-        else:
-            raise AttributeError( f"{self} does not have a 'vulnerable' attribute." )
+        # Only Pawns have a 'vulnerable' flag; they override this
+        raise AttributeError( f"{self} does not have a 'vulnerable' attribute." )
+
+    # The flag setters below do nothing here, so that they can be called on any piece; the pieces
+    # that actually have the flag (in their __slots__) override them, rather than every call
+    # asking hasattr() first.
 
     def raise_check_flag( self ) -> None:
         """Set the has_been_in_check flag to True.  This is used for castling."""
-        if hasattr( self, 'has_been_in_check' ):
-            self.has_been_in_check = True
-        else:
-            # Don't raise this exception, just return for pieces that don't care about this.
-            # raise AttributeError( f"{self} does not have a 'has_been_in_check' attribute." )
-            pass
+        # Don't raise an exception, just return for pieces that don't care about this.
+        pass
 
     def raise_moved_flag( self ) -> None:
         """Set the has_moved flag to True.  This is used for castling."""
-        if hasattr( self, 'has_moved' ):
-            self.has_moved = True
-        else:
-            # Don't raise this exception, just return for pieces that don't care about this.
-            # raise AttributeError( f"{self} does not have a 'has_moved' attribute." )
-            pass
+        # Don't raise an exception, just return for pieces that don't care about this.
+        pass
 
     def raise_passant_flag( self ) -> None:
         """Set the vulnerable flag to True.  This is used for en passant."""
-        if hasattr( self, 'vulnerable' ):
-            self.vulnerable = True
-        else:
-            # Don't raise this exception, just return for pieces that don't care about this.
-            # raise AttributeError( f"{self} does not have a 'vulnerable' attribute." )
-            pass
+        # Don't raise an exception, just return for pieces that don't care about this.
+        pass
 
     def lower_passant_flag( self ) -> None:
         """Set the vulnerable flag to False.  This is used for en passant."""
-        if hasattr( self, 'vulnerable' ):
-            self.vulnerable = False
-        else:
-            # Don't raise this exception, just return for pieces that don't care about this.
-            # raise AttributeError( f"{self} does not have a 'vulnerable' attribute." )
-            pass
+        # Don't raise an exception, just return for pieces that don't care about this.
+        pass
 
 class Pawn(ChessPiece):
     """Represents a pawn chess piece."""
@@ -120,30 +124,46 @@ class Pawn(ChessPiece):
             'light' : '♙',
             'dark'  : '♟' }
     symbol = ''
+    type_id = PAWN
+    # Pawns' patterns depend on direction and whether they've moved, so look them up by those
+    move_patterns = {
+            (  1, False ) : ( ( 0,  1 ), ( 0,  2 ) ),
+            (  1, True  ) : ( ( 0,  1 ), ),
+            ( -1, False ) : ( ( 0, -1 ), ( 0, -2 ) ),
+            ( -1, True  ) : ( ( 0, -1 ), ) }
+    capture_patterns = {
+            # Diagonal left, diagonal right, then en-pessant left and right (validated elsewhere)
+             1 : ( ( -1,  1 ), ( 1,  1 ), ( -1, 0 ), ( 1, 0 ) ),
+            -1 : ( ( -1, -1 ), ( 1, -1 ), ( -1, 0 ), ( 1, 0 ) ) }
+    __slots__ = ( 'vulnerable', 'has_moved' )
     def __init__(self, color: str):
         super().__init__(color)
         self.vulnerable = False  # Track if the pawn can be captured en passant
         self.has_moved = False # For tracking first-move option for moving two spaces forward
         self.direction = 1 if self.color == 'light' else -1 # for setting which direction the Pawn can advance based on color
 
-    def get_move_pattern( self ) -> list[ tuple[ int, int ] ]:
-        """Pawns move forward only.  "Forward" is defined by piece color."""
-        moves = [ ( 0, self.direction ) ]
+    @property
+    def is_vulnerable( self ) -> bool:
+        """Pawns can be captured en passant right after moving two squares."""
+        return self.vulnerable
+
+    def raise_moved_flag( self ) -> None:
+        self.has_moved = True
 
-        # If we have not yet moved, we also have this option:
-        if not self.has_moved:
-            moves.append( ( 0, 2 * self.direction ) )
-        return moves
+    def raise_passant_flag( self ) -> None:
+        self.vulnerable = True
 
-    def get_capture_pattern( self ) -> list[ tuple[ int, int ] ]:
+    def lower_passant_flag( self ) -> None:
+        self.vulnerable = False
+
+    def get_move_pattern( self ) -> tuple[ tuple[ int, int ], ... ]:
+        """Pawns move forward only.  "Forward" is defined by piece color.  If we have not yet
+        moved, we also have the option of moving two squares."""
+        return self.move_patterns[( self.direction, self.has_moved )]
+
+    def get_capture_pattern( self ) -> tuple[ tuple[ int, int ], ... ]:
         """Pawns capture diagonally forward, and can capture a lateral neighbor en-pessant."""
-        captures = [
-                ( -1, self.direction ),  # Diagonal left
-                (  1, self.direction ),  # Diagonal right
-                ( -1, 0 ),               # en-pessant left (validation will be in ChessCapture)
-                (  1, 0 )                # en-pessant right (validation will be in ChessCapture)
-                ]
-        return captures
+        return self.capture_patterns[self.direction]
 
 class Rook(ChessPiece):
     """Represents a rook chess piece."""
@@ -151,6 +171,9 @@ class Rook(ChessPiece):
             'light' : '♖',
             'dark'  : '♜' }
     symbol = 'R'
+    type_id = ROOK
+    move_pattern = ( ( 1, 0 ), ( -1, 0 ), ( 0, 1 ), ( 0, -1 ) )
+    __slots__ = ( 'has_moved', )
     def __init__(self, color: str):
         super().__init__(color)
         self.has_moved = False  # Track whether the rook has moved for castling purposes
@@ -160,15 +183,12 @@ class Rook(ChessPiece):
         """Rooks can slide."""
         return True
 
-    def get_move_pattern( self ) -> list[ tuple[ int, int ] ]:
+    def raise_moved_flag( self ) -> None:
+        self.has_moved = True
+
+    def get_move_pattern( self ) -> tuple[ tuple[ int, int ], ... ]:
         """Rooks move along ranks and files only."""
-        moves = [
-                (  1,  0 ),
-                ( -1,  0 ),
-                (  0,  1 ),
-                (  0, -1 )
-                ]
-        return moves
+        return self.move_pattern
 
 class Knight(ChessPiece):
     """Represents a knight chess piece."""
@@ -176,22 +196,15 @@ class Knight(ChessPiece):
             'light' : '♘',
             'dark'  : '♞' }
     symbol = 'N'
+    type_id = KNIGHT
+    move_pattern = KNIGHT_STEPS
+    __slots__ = ()
     def __init__(self, color: str):
         super().__init__(color)
 
-    def get_move_pattern( self ) -> list[ tuple[ int, int ] ]:
+    def get_move_pattern( self ) -> tuple[ tuple[ int, int ], ... ]:
         """Knights move either ±2 ranks and ±1 file or vice verse."""
-        moves = [
-                (  1,  2 ),
-                ( -1,  2 ),
-                (  1, -2 ),
-                ( -1, -2 ),
-                ( -2,  1 ),
-                (  2,  1 ),
-                ( -2, -1 ),
-                (  2, -1 )
-                ]
-        return moves
+        return self.move_pattern
 
 class Bishop(ChessPiece):
     """Represents a bishop chess piece."""
@@ -199,6 +212,9 @@ class Bishop(ChessPiece):
             'light' : '♗',
             'dark'  : '♝' }
     symbol = 'B'
+    type_id = BISHOP
+    move_pattern = ( ( 1, 1 ), ( -1, 1 ), ( -1, -1 ), ( 1, -1 ) )
+    __slots__ = ()
     def __init__(self, color: str):
         super().__init__(color)
 
@@ -207,15 +223,9 @@ class Bishop(ChessPiece):
         """Bishops can slide."""
         return True
 
-    def get_move_pattern( self ) -> list[ tuple[ int, int ] ]:
+    def get_move_pattern( self ) -> tuple[ tuple[ int, int ], ... ]:
         """Bishops move along diagonals only."""
-        moves = [
-                (  1,  1 ),
-                ( -1,  1 ),
-                ( -1, -1 ),
-                (  1, -1 )
-                ]
-        return moves
+        return self.move_pattern
 
 class Queen(ChessPiece):
     """Represents a queen chess piece."""
@@ -223,6 +233,9 @@ class Queen(ChessPiece):
             'light' : '♕',
             'dark'  : '♛' }
     symbol = 'Q'
+    type_id = QUEEN
+    move_pattern = KING_STEPS # Same directions as a King, just as far as the Queen likes
+    __slots__ = ()
     def __init__(self, color: str):
         super().__init__(color)
 
@@ -231,19 +244,9 @@ class Queen(ChessPiece):
         """Queens can slide."""
         return True
 
-    def get_move_pattern( self ) -> list[ tuple[ int, int ] ]:
+    def get_move_pattern( self ) -> tuple[ tuple[ int, int ], ... ]:
         """Queens move in diagonals, ranks, and files."""
-        moves = [
-                (  1,  0 ),
-                ( -1,  0 ),
-                (  0,  1 ),
-                (  0, -1 ),
-                (  1,  1 ),
-                ( -1,  1 ),
-                ( -1, -1 ),
-                (  1, -1 )
-                ]
-        return moves
+        return self.move_pattern
 
 class King(ChessPiece):
     """Represents a king chess piece."""
@@ -251,24 +254,29 @@ class King(ChessPiece):
             'light' : '♔',
             'dark'  : '♚' }
     symbol = 'K'
+    type_id = KING
+    move_pattern = KING_STEPS
+    __slots__ = ( 'has_moved', 'has_been_in_check' )
     def __init__(self, color: str):
         super().__init__(color)
         self.has_moved = False  # Track whether the king has moved for castling purposes
         self.has_been_in_check = False  # Track whether the king has been in check at any point for castling purposes
 
-    def get_move_pattern( self ) -> list[ tuple[ int, int ] ]:
+    def raise_check_flag( self ) -> None:
+        self.has_been_in_check = True
+
+    def raise_moved_flag( self ) -> None:
+        self.has_moved = True
+
+    def get_move_pattern( self ) -> tuple[ tuple[ int, int ], ... ]:
         """Kings move in diagonals, ranks, and files, but only one space."""
-        moves = [
-                (  1,  0 ),
-                ( -1,  0 ),
-                (  0,  1 ),
-                (  0, -1 ),
-                (  1,  1 ),
-                ( -1,  1 ),
-                ( -1, -1 ),
-                (  1, -1 )
-                ]
-        return moves
+        return self.move_pattern
+
+# Every kind of piece's glyph, indexed by piece_id, so that drawing a piece is one tuple lookup
+GLYPHS = tuple(
+        piece_type.glyph[color]
+        for color in ( 'light', 'dark' )
+        for piece_type in ( Pawn, Knight, Bishop, Rook, Queen, King ) )
 
 def main():
     p = [
@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
-import re
 from enum import IntEnum
 
+RESET = '\x1b[0m'
+
+# Escape sequences already worked out by escape() and set(), keyed by the color and the
+# arguments they were asked for with, since the same few are asked for over and over.
+_ESCAPES = {}
+_SETS = {}
+
 class Color(IntEnum):
     BLACK = 0
     RED = 1
@@ -24,10 +30,23 @@ class Color(IntEnum):
         Returns:
             The colorized text
         """
-        color_codes = []
+        if not ( fg or bg or bold ):
+            return f'{self.set()}{text}{RESET}'
 
-        if not any( [fg, bg, bold] ):
-            return f'{self.set()}{text}{self.reset()}'
+        escape = self.escape( fg, bg, bold )
+        if not escape:
+            return text
+        else:
+            return f'{escape}{text}{RESET}'
+
+    def escape( self, fg=None, bg=None, bold: bool = False ) -> str:
+        """Returns the escape sequence that __call__ starts colorized text with, given the same
+        colors, or an empty string if there's nothing to set.  Handy for building up colorized
+        output ahead of time rather than on each call."""
+        key = ( self, fg, bg, bold )
+        if key in _ESCAPES:
+            return _ESCAPES[key]
+        color_codes = []
 
         if fg is not None:
             color_codes.append( str( fg.value + 30 + ( 60 if bold else 0 ) ) )
@@ -37,18 +56,20 @@ class Color(IntEnum):
         if bg is not None:
             color_codes.append( str( bg.value + 40 ) )
 
-        if not color_codes:
-            return text
-        else:
-            return f'\x1b[{";".join( color_codes )}m{text}\x1b[0m'
+        escape = f'\x1b[{";".join( color_codes )}m' if color_codes else ''
+        _ESCAPES[key] = escape
+        return escape
 
     def set( self, fg: bool = True, bg: bool = False, bold: bool = False ) -> str:
-        color_code = self.value + (30 if fg else 0) + (60 if bold else 0) + (40 if bg else 0)
-        return f"\x1b[{color_code}m"
+        key = ( self, fg, bg, bold )
+        if key not in _SETS:
+            color_code = self.value + (30 if fg else 0) + (60 if bold else 0) + (40 if bg else 0)
+            _SETS[key] = f"\x1b[{color_code}m"
+        return _SETS[key]
 
     @staticmethod
     def reset() -> str:
-        return f"\x1b[0m"
+        return RESET
 
     @staticmethod
     def rgb(r: int, g: int, b: int, text: str, bg: bool = False) -> str:
@@ -3,42 +3,37 @@ import unittest
 from color import Color
 from chess_board import ChessBoard, Square
 from chess_move import *
-from chess_piece import *
+from chess_piece import ChessPiece, Pawn, Rook, Knight, Bishop, Queen, King
 from chess_exception import *
+from magics import rook_attacks, bishop_attacks, queen_attacks
+from chess_notation import ChessNotationConverter
 
 from unittest import mock
 from io import StringIO
+from copy import deepcopy
+from collections import OrderedDict
 
 class TestColor(unittest.TestCase):
-    def test_fg(self):
-        result = f"{Color.BLUE('hello')} there"
-        self.assertEqual(result, "\x1b[34mhello\x1b[0m there")
-
-    def test_fg_bold(self):
-        result = f"{Color.BLUE('hello', bold = True)} there"
-        self.assertEqual(result, "\x1b[64mhello\x1b[0m there")
-
-    def test_bg(self):
-        result = f"{Color.WHITE('hello', bg=Color.BLUE)} there"
-        self.assertEqual(result, "\x1b[44mhello\x1b[0m there")
-
-    def test_bg_bold(self):
-        result = f"{Color.WHITE('hello', bold = True, bg = Color.BLUE)} there"
-        self.assertEqual(result, "\x1b[67;44mhello\x1b[0m there")
-
-    def test_rgb(self):
-        result = f"{Color.rgb(1, 2, 3, 'hello')} there"
-        self.assertEqual(result, "\x1b[38;2;1;2;3mhello\x1b[0m there")
-
-    def test_rgb_bold(self):
-        result = f"{Color.rgb(1, 2, 3, 'hello', bg = True)} there"
-        self.assertEqual(result, "\x1b[48;2;1;2;3mhello\x1b[0m there")
+    # Ways of colorizing 'hello', and what they should come out as
+    CASES = (
+            ( 'fg',       lambda: Color.BLUE('hello'),                               "\x1b[34mhello\x1b[0m" ),
+            ( 'fg_bold',  lambda: Color.BLUE('hello', bold = True),                  "\x1b[64mhello\x1b[0m" ),
+            ( 'bg',       lambda: Color.WHITE('hello', bg=Color.BLUE),               "\x1b[44mhello\x1b[0m" ),
+            ( 'bg_bold',  lambda: Color.WHITE('hello', bold = True, bg = Color.BLUE), "\x1b[67;44mhello\x1b[0m" ),
+            ( 'rgb',      lambda: Color.rgb(1, 2, 3, 'hello'),                       "\x1b[38;2;1;2;3mhello\x1b[0m" ),
+            ( 'rgb_bold', lambda: Color.rgb(1, 2, 3, 'hello', bg = True),            "\x1b[48;2;1;2;3mhello\x1b[0m" ) )
+
+    def test_colors(self):
+        for case, colorize, expected in self.CASES:
+            with self.subTest(case = case):
+                self.assertEqual(colorize(), expected)
 
     def test_inline(self):
         result = f'{Color.BLUE.set(fg = True)}hello{Color.reset()}'
         self.assertEqual( result, Color.BLUE('hello') )
 
     def test_call( self ):
+        # The reset has to end the colorized text, leaving whatever follows it alone
         result = f'{Color.BLUE("hello")} there'
         self.assertEqual( result,  "\x1b[34mhello\x1b[0m there" )
 
@@ -73,17 +68,16 @@ class TestChessPieces(unittest.TestCase):
 
         # 1. Test for equality
         self.assertEqual(light_rook1, light_rook2, "Pieces of same type and color should be equal")
-        self.assertTrue(light_rook1 == light_rook2, "Equality operator should work")
 
         # 2. Test for inequality
         self.assertNotEqual(light_rook1, dark_rook, "Pieces of different colors should not be equal")
         self.assertNotEqual(light_rook1, light_knight, "Pieces of different types should not be equal")
         self.assertNotEqual(light_rook1, "Rook", "Piece should not be equal to a string or other object")
-        self.assertFalse(light_rook1 == dark_rook, "Inequality operator should work")
 
         # 3. Test hashing
-        self.assertEqual(hash(light_rook1), hash(light_rook2), "Hashes of equal pieces should be equal")
-        self.assertNotEqual(hash(light_rook1), hash(dark_rook), "Hashes of unequal pieces should not be equal")
+        light_rook1_hash, light_rook2_hash, dark_rook_hash = hash(light_rook1), hash(light_rook2), hash(dark_rook)
+        self.assertEqual(light_rook1_hash, light_rook2_hash, "Hashes of equal pieces should be equal")
+        self.assertNotEqual(light_rook1_hash, dark_rook_hash, "Hashes of unequal pieces should not be equal")
 
         # 4. Test set membership (relies on both __eq__ and __hash__)
         piece_set = {light_rook1, dark_rook}
@@ -91,140 +85,64 @@ class TestChessPieces(unittest.TestCase):
         self.assertNotIn(light_knight, piece_set, "A different piece should not be found in the set")
 
 
-    def test_pawn(self):
-        """Tests the Pawn piece."""
-        light_pawn = Pawn('light')
-        dark_pawn = Pawn('dark')
-
-        # Test attributes
-        self.assertEqual(light_pawn.color, 'light')
-        self.assertEqual(dark_pawn.color, 'dark')
-        self.assertEqual(light_pawn.name, 'pawn')
-        self.assertEqual(Pawn.symbol, '') # Pawns have no symbol in algebraic notation
-
-        # Test string representation (glyph)
-        self.assertEqual(str(light_pawn), '♙')
-        self.assertEqual(str(dark_pawn), '♟')
-
-        # Test representation
-        self.assertEqual(repr(light_pawn), 'Pawn( "light" )')
-
-    def test_rook(self):
-        """Tests the Rook piece."""
-        light_rook = Rook('light')
-        dark_rook = Rook('dark')
-
-        # Test attributes
-        self.assertEqual(light_rook.color, 'light')
-        self.assertEqual(dark_rook.color, 'dark')
-        self.assertEqual(light_rook.name, 'rook')
-        self.assertEqual(Rook.symbol, 'R')
-
-        # Test string representation (glyph)
-        self.assertEqual(str(light_rook), '♖')
-        self.assertEqual(str(dark_rook), '♜')
-
-        # Test representation
-        self.assertEqual(repr(dark_rook), 'Rook( "dark" )')
-
-    def test_knight(self):
-        """Tests the Knight piece."""
-        light_knight = Knight('light')
-        dark_knight = Knight('dark')
-
-        # Test attributes
-        self.assertEqual(light_knight.color, 'light')
-        self.assertEqual(dark_knight.color, 'dark')
-        self.assertEqual(light_knight.name, 'knight')
-        self.assertEqual(Knight.symbol, 'N') # 'N' is standard for Knight
-
-        # Test string representation (glyph)
-        self.assertEqual(str(light_knight), '♘')
-        self.assertEqual(str(dark_knight), '♞')
-
-        # Test representation
-        self.assertEqual(repr(light_knight), 'Knight( "light" )')
-
-    def test_bishop(self):
-        """Tests the Bishop piece."""
-        light_bishop = Bishop('light')
-        dark_bishop = Bishop('dark')
-
-        # Test attributes
-        self.assertEqual(light_bishop.color, 'light')
-        self.assertEqual(dark_bishop.color, 'dark')
-        self.assertEqual(light_bishop.name, 'bishop')
-        self.assertEqual(Bishop.symbol, 'B')
-
-        # Test string representation (glyph)
-        self.assertEqual(str(light_bishop), '♗')
-        self.assertEqual(str(dark_bishop), '♝')
-
-        # Test representation
-        self.assertEqual(repr(dark_bishop), 'Bishop( "dark" )')
-
-    def test_queen(self):
-        """Tests the Queen piece."""
-        light_queen = Queen('light')
-        dark_queen = Queen('dark')
-
-        # Test attributes
-        self.assertEqual(light_queen.color, 'light')
-        self.assertEqual(dark_queen.color, 'dark')
-        self.assertEqual(light_queen.name, 'queen')
-        self.assertEqual(Queen.symbol, 'Q')
-
-        # Test string representation (glyph)
-        self.assertEqual(str(light_queen), '♕')
-        self.assertEqual(str(dark_queen), '♛')
-
-        # Test representation
-        self.assertEqual(repr(light_queen), 'Queen( "light" )')
-
-    def test_king(self):
-        """Tests the King piece."""
-        light_king = King('light')
-        dark_king = King('dark')
-
-        # Test attributes
-        self.assertEqual(light_king.color, 'light')
-        self.assertEqual(dark_king.color, 'dark')
-        self.assertEqual(light_king.name, 'king')
-        self.assertEqual(King.symbol, 'K')
-
-        # Test string representation (glyph)
-        self.assertEqual(str(light_king), '♔')
-        self.assertEqual(str(dark_king), '♚')
-
-        # Test representation
-        self.assertEqual(repr(dark_king), 'King( "dark" )')
+    # Each kind of piece, with its name, notation symbol, and light and dark glyphs
+    PIECES = (
+            ( Pawn,   'pawn',   '',  '♙', '♟' ), # Pawns have no symbol in algebraic notation
+            ( Rook,   'rook',   'R', '♖', '♜' ),
+            ( Knight, 'knight', 'N', '♘', '♞' ), # 'N' is standard for Knight
+            ( Bishop, 'bishop', 'B', '♗', '♝' ),
+            ( Queen,  'queen',  'Q', '♕', '♛' ),
+            ( King,   'king',   'K', '♔', '♚' ) )
+
+    def test_pieces(self):
+        """Tests each kind of piece's attributes and representations."""
+        for piece_type, name, symbol, light_glyph, dark_glyph in self.PIECES:
+            with self.subTest(piece = piece_type.__name__):
+                light_piece = piece_type('light')
+                dark_piece = piece_type('dark')
+
+                # Test attributes
+                self.assertEqual(light_piece.color, 'light')
+                self.assertEqual(dark_piece.color, 'dark')
+                self.assertEqual(light_piece.name, name)
+                self.assertEqual(piece_type.symbol, symbol)
+
+                # Test string representation (glyph)
+                self.assertEqual(str(light_piece), light_glyph)
+                self.assertEqual(str(dark_piece), dark_glyph)
+
+                # Test representation
+                self.assertEqual(repr(light_piece), f'{piece_type.__name__}( "light" )')
+                self.assertEqual(repr(dark_piece), f'{piece_type.__name__}( "dark" )')
 
 class TestChessBoard(unittest.TestCase):
     def setUp(self):
         self.board = ChessBoard()
 
     def test_board_initialization(self):
-        self.assertEqual(len(self.board.squares), 64)
-        self.assertIsInstance(self.board.squares['a1'], Square)
-        self.assertEqual(self.board.squares['a1'].color, 'dark')
-        self.assertEqual(self.board.squares['h8'].color, 'dark')
-        self.assertEqual(self.board.squares['a8'].color, 'light')
+        squares = self.board.squares
+        self.assertEqual(len(squares), 64)
+        self.assertIsInstance(squares['a1'], Square)
+        self.assertEqual(squares['a1'].color, 'dark')
+        self.assertEqual(squares['h8'].color, 'dark')
+        self.assertEqual(squares['a8'].color, 'light')
 
     def test_board_setup(self):
         self.board.setup()
         # Test a few key pieces
-        self.assertIsInstance(self.board.get_piece('a1'), Rook)
+        self.assertIs(type(self.board.get_piece('a1')), Rook)
         self.assertEqual(self.board.get_piece('a1').color, 'light') # type: ignore
-        self.assertIsInstance(self.board.get_piece('e8'), King)
+        self.assertIs(type(self.board.get_piece('e8')), King)
         self.assertEqual(self.board.get_piece('e8').color, 'dark') # type: ignore
-        self.assertIsInstance(self.board.get_piece('d2'), Pawn)
+        self.assertIs(type(self.board.get_piece('d2')), Pawn)
         self.assertIsNone(self.board.get_piece('d4'))
 
     def test_clear_board(self):
         self.board.setup()
         self.board.clear()
-        for square in self.board.squares.values():
-            self.assertIsNone(square.contains())
+        occupied = [ key for key, square in self.board.squares.items() if square.contains() is not None ]
+        self.assertEqual(occupied, [], f'Squares still occupied after clear(): {occupied}')
+        self.assertEqual(self.board.occ_all, 0) # The bitboards were emptied, too
 
     def test_board_moving_pieces(self): 
         # This is just actually the moving if pieces, not rules validataion.
@@ -245,6 +163,196 @@ class TestChessBoard(unittest.TestCase):
         self.assertIsInstance(self.board.get_piece('d5'), Rook)
         self.assertIsInstance(self.board.get_piece('e5'), Rook)
 
+    def test_bitboards_track_squares(self):
+        # Whether placed through the board or straight onto a Square, the bitboards should
+        # agree with what the Squares hold.
+        self.board.setup()
+        self.assertEqual( self.board.occ_all, 0xFFFF00000000FFFF )
+        self.assertEqual( self.board.occ[0], 0x000000000000FFFF )
+        self.board.move_piece( 'g1', 'f3' )
+        self.board['e5'].place( Pawn( 'light' ) )
+        self.board.remove_piece( 'd7' )
+        for square in self.board.squares.values():
+            self.assertEqual( square.is_occupied(), bool( self.board.occ_all >> square.index & 1 ), square.key )
+
+    def test_knight_attacks(self):
+        self.board.clear()
+        self.board['e4'].place( Knight( 'dark' ) )
+        self.assertTrue( self.board.is_in_check_from( self.board['f2'], 'dark' ) )
+        self.assertTrue( self.board.is_in_check_from( self.board['d6'], 'dark' ) )
+        self.assertFalse( self.board.is_in_check_from( self.board['e5'], 'dark' ) )
+
+    def test_squares_and_pieces_have_slots(self):
+        # The board makes 64 Squares and up to 32 pieces, so none of them should carry a __dict__
+        self.assertFalse(hasattr(self.board['a1'], '__dict__'))
+        for piece in ( Pawn('light'), Rook('light'), Knight('light'), Bishop('light'), Queen('light'), King('light') ):
+            self.assertFalse(hasattr(piece, '__dict__'), f'{piece!r} has a __dict__')
+
+    def test_square_hash_survives_occupant_change(self):
+        square = self.board['d4']
+        squares = { square }
+        square.place( Queen( 'light' ) )
+        self.assertIn( square, squares )
+        # Boards still compare what's on the squares, though
+        self.assertNotEqual( self.board, ChessBoard() )
+
+    def test_zobrist_hash(self):
+        fresh = ChessBoard()
+        fresh.setup()
+        self.board.setup()
+        # Knights out and back again is the same position, so it should hash the same
+        for from_key, to_key in ( ( 'g1', 'f3' ), ( 'g8', 'f6' ), ( 'f3', 'g1' ), ( 'f6', 'g8' ) ):
+            self.board.move_piece( from_key, to_key )
+        self.assertEqual( hash( self.board ), hash( fresh ) )
+        # ...but not if it's the other side's turn
+        self.board.turn = 'dark'
+        self.assertNotEqual( hash( self.board ), hash( fresh ) )
+        self.board.turn = 'light'
+        # ...nor once a Rook has moved and lost its castling rights
+        self.board['h1'].occupant.raise_moved_flag()
+        self.assertNotEqual( hash( self.board ), hash( fresh ) )
+
+    def test_en_passant_flag_changes_hash_on_any_rank(self):
+        # A hand-built position with a vulnerable Pawn where no double step could have left it
+        self.board['e3'].place( Pawn( 'light' ) )
+        self.board['d3'].place( Pawn( 'dark' ) )
+        self.board.turn = 'dark'
+        before = hash( self.board )
+        self.assertEqual( self.board.get_legal_targets( 'd3', is_capture = True ), 0 )
+        self.board['e3'].occupant.raise_passant_flag()
+        self.assertNotEqual( hash( self.board ), before )
+        # ...so the cached captures from before the flag went up aren't handed out again
+        self.assertEqual( self.board.get_legal_targets( 'd3', is_capture = True ), 1 << 20 ) # e3
+
+    def test_make_and_unmake_move(self):
+        self.board.setup()
+        before = ( list( self.board.bb ), list( self.board.occ ), self.board.occ_all, hash( self.board ) )
+        self.assertEqual( self.board.king_sq, [4, 60] )
+        # King e1 takes the dark Pawn on e7 (no, that isn't legal, but the bitboards don't care)
+        pieces = self.board.make_move( 4, 52, 52 )
+        self.assertEqual( self.board.king_sq, [52, 60] )
+        self.assertFalse( self.board.occ[1] >> 52 & 1 )
+        self.board.unmake_move( 4, 52, 52, pieces )
+        self.assertEqual( ( self.board.bb, self.board.occ, self.board.occ_all, hash( self.board ) ), before )
+        self.assertEqual( self.board.king_sq, [4, 60] )
+
+    def test_push_and_pop_move(self):
+        self.board.setup()
+        before = ( str( self.board ), hash( self.board ), self.board.turn )
+        self.board.push_move( 12, 28 ) # e2 to e4
+        self.assertIsNone( self.board['e2'].contains() )
+        self.assertTrue( self.board['e4'].contains().has_moved )
+        self.assertEqual( self.board.turn, 'dark' )
+        self.board.push_move( 57, 42 ) # Nb8 to c6
+        self.board.pop_move()
+        self.board.pop_move()
+        self.assertEqual( ( str( self.board ), hash( self.board ), self.board.turn ), before )
+        self.assertFalse( self.board['e2'].contains().has_moved )
+
+    def test_legal_moves_are_cached_per_position(self):
+        self.board.setup()
+        moves = self.board.get_legal_moves( 'e2' )
+        self.assertIs( self.board.get_legal_moves( 'e2' ), moves )
+        self.assertEqual( self.board.get_legal_targets( 'e2' ), 1 << 20 | 1 << 28 ) # e3 and e4
+        # Blocking the Pawn changes the position, so the moves get worked out again
+        self.board.move_piece( 'e7', 'e3' )
+        self.assertNotIn( self.board['e3'], self.board.get_legal_moves( 'e2' ) )
+        self.assertEqual( [ square.key for square in self.board.get_legal_captures( 'd2' ) ], [ 'e3' ] )
+
+    def test_position_is_hashed_once_per_query(self):
+        self.board.setup()
+        # Hashing walks the Pawns for en passant flags, so a query shouldn't do it more than once
+        with mock.patch.object( ChessBoard, '_flags_key', autospec = True, side_effect = ChessBoard._flags_key ) as flags_key:
+            self.board.get_legal_moves( 'e2' )
+            self.board.validate_many( ( 'e2', 'g1', 'b1' ), ( 'e4', 'f3', 'c3' ) )
+        self.assertEqual( flags_key.call_count, 2 )
+
+    def test_validate_many(self):
+        self.board.setup()
+        self.assertEqual(
+                self.board.validate_many( ( 'e2', 'e2', 'e2', 'g1', 'e7', 'e4' ), ( 'e4', 'e5', 'd3', 'f3', 'e5', 'e5' ) ),
+                [ True, False, False, True, False, False ] ) # Dark can't move on light's turn, and e4 is empty
+        self.board.move_piece( 'd7', 'd3' )
+        self.assertEqual( self.board.validate_many( ( 'e2', 'c2' ), ( 'd3', 'd3' ), is_capture = True ), [ True, True ] )
+
+    def test_castling_rights(self):
+        self.board.setup()
+        self.assertEqual( self.board.castling_rights, 0b1111 )
+        self.board['h1'].contains().raise_moved_flag()
+        self.assertEqual( self.board.castling_rights, 0b1110 )
+        self.board.remove_piece( 'e8' )
+        self.assertEqual( self.board.castling_rights, 0b0010 )
+
+    def test_can_reach(self):
+        self.board.setup()
+        self.assertTrue( self.board.can_reach( 'g1', 'f3' ) )
+        self.assertFalse( self.board.can_reach( 'g1', 'e2' ) ) # Friendly Pawn in the way
+        self.board.move_piece( 'd7', 'e3' )
+        self.assertTrue( self.board.can_reach( 'd2', 'e3' ) )
+        self.assertFalse( self.board.can_reach( 'e2', 'e3' ) ) # Pawns don't capture forward
+
+    def test_pinned_pieces(self):
+        self.board.clear()
+        self.board['e1'].place( King( 'light' ) )
+        self.board['e3'].place( Rook( 'light' ) )
+        self.board['d2'].place( Bishop( 'light' ) )
+        self.board['e8'].place( Rook( 'dark' ) )
+        self.board['a5'].place( Bishop( 'dark' ) )
+        # The Rook may only slide along the e-file, up to and including the dark Rook
+        self.assertEqual( sorted( square.key for square in self.board.get_legal_moves( 'e3' ) ), [ 'e2', 'e4', 'e5', 'e6', 'e7' ] )
+        self.assertEqual( [ square.key for square in self.board.get_legal_captures( 'e3' ) ], [ 'e8' ] )
+        # The Bishop may only go as far as the dark Bishop pinning it
+        self.assertEqual( sorted( square.key for square in self.board.get_legal_moves( 'd2' ) ), [ 'b4', 'c3' ] )
+        self.assertEqual( [ square.key for square in self.board.get_legal_captures( 'd2' ) ], [ 'a5' ] )
+
+    def test_end_turn_records_positions(self):
+        self.board.setup()
+        for from_key, to_key in ( ( 'g1', 'f3' ), ( 'g8', 'f6' ), ( 'f3', 'g1' ), ( 'f6', 'g8' ) ):
+            self.board.move_piece( from_key, to_key )
+            self.board.end_turn()
+        # Back where we started, which counts as the second time for this position
+        self.assertEqual( self.board.repetition_counts[hash( self.board )], 2 )
+        self.assertEqual( self.board.game_states[ ( 2, 'dark' ) ], hash( self.board ) )
+        for from_key, to_key in ( ( 'g1', 'f3' ), ( 'g8', 'f6' ), ( 'f3', 'g1' ), ( 'f6', 'g8' ) ):
+            self.board.move_piece( from_key, to_key )
+            self.board.end_turn()
+        self.assertEqual( self.board.repetition_counts[hash( self.board )], 3 )
+
+    def test_is_repetition(self):
+        self.board.setup()
+        self.assertFalse( self.board.is_repetition() )
+        for from_key, to_key in ( ( 'g1', 'f3' ), ( 'g8', 'f6' ), ( 'f3', 'g1' ) ):
+            self.board.move_piece( from_key, to_key )
+            self.board.end_turn()
+            self.assertFalse( self.board.is_repetition() )
+        self.board.move_piece( 'f6', 'g8' )
+        self.board.end_turn()
+        self.assertTrue( self.board.is_repetition() )
+        # A Pawn move can't be taken back, so nothing before it counts any more
+        self.board.move_piece( 'e2', 'e4' )
+        self.board.end_turn()
+        self.assertEqual( self.board.irreversible_ply, 5 )
+        self.assertFalse( self.board.is_repetition() )
+
+    def test_pawn_attacks(self):
+        self.board.clear()
+        self.board['a2'].place( Pawn( 'light' ) )
+        self.board['h7'].place( Pawn( 'dark' ) )
+        self.assertTrue( self.board.is_in_check_from( self.board['b3'], 'light' ) )
+        self.assertFalse( self.board.is_in_check_from( self.board['a3'], 'light' ) )
+        self.assertFalse( self.board.is_in_check_from( self.board['h3'], 'light' ) )
+        self.assertTrue( self.board.is_in_check_from( self.board['g6'], 'dark' ) )
+        self.assertFalse( self.board.is_in_check_from( self.board['g8'], 'dark' ) )
+
+    def test_attacked_squares_match_is_in_check_from(self):
+        self.board.setup()
+        self.board.move_piece( 'e2', 'e4' )
+        self.board.move_piece( 'd8', 'h4' )
+        for color in ( 'light', 'dark' ):
+            attacked = self.board.attacked_squares( color )
+            for square in self.board.square_list:
+                self.assertEqual( bool( attacked >> square.index & 1 ), self.board.is_in_check_from( square, color ), f'{color} on {square.key}' )
+
 class TestEnPassant(unittest.TestCase):
 
     def setUp(self):
@@ -273,6 +381,26 @@ class TestEnPassant(unittest.TestCase):
         self.assertTrue(self.board['b6'].is_occupied(), "Capturing pawn should be on e6")
         self.assertFalse(self.board['b5'].is_occupied(), "Square e5 should be empty after capture")
 
+    def test_standalone_en_passant_check_matches_legal_captures(self):
+        # validate_is_successful_en_passant isn't on execute()'s path, so check that it still
+        # agrees with get_legal_captures about what is and isn't an en passant capture
+        self.board['e5'].place( Pawn( 'light' ) )
+        self.board['d5'].place( Pawn( 'dark' ) )
+        self.board['c5'].place( Pawn( 'dark' ) )
+        self.board['d5'].occupant.raise_passant_flag()
+        self.board['c5'].occupant.raise_passant_flag()
+        def agree( to_key, expected ):
+            cm = ChessCapture( self.board, 'e5', to_key )
+            self.assertIs( cm.validate_is_successful_en_passant( cm.piece, self.board[to_key].occupant ), expected, to_key )
+            self.assertIs( self.board.can_reach( 'e5', to_key ), expected, to_key )
+        agree( 'd5', True )
+        agree( 'c5', False ) # Two files away
+        self.board['d6'].place( Knight( 'dark' ) )
+        agree( 'd5', False ) # Somebody's on the square behind it
+        self.board['d6'].remove()
+        self.board['d5'].occupant.lower_passant_flag()
+        agree( 'd5', False ) # Not vulnerable any more
+
     def test_dark_captures_light_en_passant(self):
         self.board.setup()
 
@@ -335,7 +463,37 @@ class TestGeneralCaptures(unittest.TestCase):
         captured = move.execute()
         self.assertIsNotNone(captured)
         self.assertTrue(self.board['d5'].is_occupied())
-        self.board.clear()  # Clear the board for next test
+
+    def test_move_equality_and_hash(self):
+        self.board['e4'].place(Pawn('light'))
+        self.board['d5'].place(Pawn('dark'))
+        capture = ChessCapture(self.board, 'e4', 'd5')
+        self.assertEqual(capture, ChessCapture(self.board, 'e4', 'd5'))
+        self.assertNotEqual(capture, ChessCapture(self.board, 'd5', 'e4'))
+        self.assertNotEqual(capture, ChessMove(self.board, 'e4', 'd5'))
+        self.assertEqual(len({capture, ChessCapture(self.board, 'e4', 'd5')}), 1)
+        # The same move on a copy of the board is a move in some other game
+        self.assertNotEqual(capture, ChessCapture(deepcopy(self.board), 'e4', 'd5'))
+
+    def test_pseudo_validate_ignores_pins(self):
+        self.board['e1'].place(King('light'))
+        self.board['e3'].place(Rook('light'))
+        self.board['e8'].place(Rook('dark'))
+        # Sideways is how a Rook moves, but this one is pinned to its King
+        move = ChessMove(self.board, 'e3', 'd3')
+        self.assertTrue(move.pseudo_validate())
+        with self.assertRaises(ChessCannotMoveOutsideMovementPatternException):
+            move.legalize()
+        with self.assertRaises(ChessCannotMoveOutsideMovementPatternException):
+            ChessMove(self.board, 'e3', 'f4').pseudo_validate()
+
+    def test_unchecked_move_matches_checked(self):
+        self.board['e4'].place(Pawn('light'))
+        self.board['d5'].place(Pawn('dark'))
+        capture = ChessCapture.unchecked(self.board, 'e4', 'd5')
+        self.assertEqual(capture, ChessCapture(self.board, 'e4', 'd5'))
+        self.assertIs(capture.piece, self.board['e4'].contains())
+        self.assertTrue(capture.validate())
 
     def test_pawn_cannot_capture_forward(self):
         self.board['e4'].place(Pawn('light'))
@@ -344,7 +502,6 @@ class TestGeneralCaptures(unittest.TestCase):
         move = ChessCapture(self.board, 'e4', 'e5')
         with self.assertRaises(ChessCannotCaptureOutsideCapturePatternException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
 
     def test_knight_can_capture_over_pieces(self):
         self.board['g1'].place(Knight('light'))
@@ -357,7 +514,6 @@ class TestGeneralCaptures(unittest.TestCase):
         self.assertIsNotNone(captured)
         self.assertEqual(captured.color, 'dark')
         self.assertTrue(self.board['f3'].is_occupied())
-        self.board.clear()  # Clear the board for next test
 
     def test_bishop_can_capture_clear_path(self):
         self.board['c1'].place(Bishop('light'))
@@ -368,7 +524,6 @@ class TestGeneralCaptures(unittest.TestCase):
         captured = move.execute()
         self.assertIsNotNone(captured)
         self.assertTrue(self.board['g5'].is_occupied())
-        self.board.clear()  # Clear the board for next test
 
     def test_bishop_cannot_capture_through_obstruction(self):
         self.board['c1'].place(Bishop('light'))
@@ -378,7 +533,6 @@ class TestGeneralCaptures(unittest.TestCase):
         move = ChessCapture(self.board, 'c1', 'g5')
         with self.assertRaises(ChessCannotCaptureOutsideCapturePatternException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
 
     def test_rook_can_capture_clear_path(self):
         self.board['a1'].place(Rook('light'))
@@ -389,7 +543,6 @@ class TestGeneralCaptures(unittest.TestCase):
         captured = move.execute()
         self.assertIsNotNone(captured)
         self.assertEqual(captured.color, 'dark')
-        self.board.clear()  # Clear the board for next test
 
     def test_rook_cannot_capture_through_piece(self):
         self.board['a1'].place(Rook('light'))
@@ -399,7 +552,6 @@ class TestGeneralCaptures(unittest.TestCase):
         move = ChessCapture(self.board, 'a1', 'a7')
         with self.assertRaises(ChessCannotCaptureOutsideCapturePatternException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
 
     def test_queen_can_capture_long_range(self):
         self.board['d1'].place(Queen('light'))
@@ -410,7 +562,6 @@ class TestGeneralCaptures(unittest.TestCase):
         captured = move.execute()
         self.assertIsNotNone(captured)
         self.assertEqual(captured.color, 'dark')
-        self.board.clear()  # Clear the board for next test
 
     def test_queen_blocked_from_capture(self):
         self.board['d1'].place(Queen('light'))
@@ -420,7 +571,6 @@ class TestGeneralCaptures(unittest.TestCase):
         move = ChessCapture(self.board, 'd1', 'h5')
         with self.assertRaises(ChessCannotCaptureOutsideCapturePatternException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
 
 class TestPawnPromotion(unittest.TestCase):
     def setUp( self ):
@@ -446,6 +596,13 @@ class TestPawnPromotion(unittest.TestCase):
         move.execute()
         self.assertTrue( self.board['d8'].contains() == Queen( 'light' ) )
 
+    def test_promotion_refused_on_own_back_rank( self ):
+        self.setup_pawn( 'light' )
+        self.board.place_piece( Pawn( 'light' ), 'a', 1 ) # Rank 1 is dark's promotion rank, not light's
+        move = ChessMove.from_long_notation( self.board, 'd7d8' )
+        with self.assertRaises( ValueError ):
+            move.promote( self.board['a1'], Queen )
+
 class TestCastling(unittest.TestCase):
 
     def setUp(self):
@@ -467,7 +624,6 @@ class TestCastling(unittest.TestCase):
         move.execute()
         self.assertTrue(isinstance(self.board['g1'].contains(), King))
         self.assertTrue(isinstance(self.board['f1'].contains(), Rook))
-        self.board.clear()  # Clear the board for next test
 
     def test_valid_queenside_castle_dark(self):
         self.setup_king_rook_pair('dark', kingside=False)
@@ -477,7 +633,6 @@ class TestCastling(unittest.TestCase):
         move.execute()
         self.assertTrue(isinstance(self.board['c8'].contains(), King))
         self.assertTrue(isinstance(self.board['d8'].contains(), Rook))
-        self.board.clear()  # Clear the board for next test
 
     def test_blocked_kingside_castle(self):
         self.setup_king_rook_pair('light', kingside=True)
@@ -485,7 +640,13 @@ class TestCastling(unittest.TestCase):
         move = ChessCastle(self.board, 'e1', 'g1')
         with self.assertRaises(ChessCannotCastleThroughOccupiedSquaresException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
+
+    def test_occupied_kingside_destination(self):
+        self.setup_king_rook_pair('light', kingside=True)
+        self.board['g1'].place(Knight('light'))
+        move = ChessCastle(self.board, 'e1', 'g1')
+        with self.assertRaises(ChessCannotCastleThroughOccupiedSquaresException):
+            move.validate()
 
     def test_rook_has_moved_invalidates_castling(self):
         self.setup_king_rook_pair('dark', kingside=True)
@@ -494,7 +655,6 @@ class TestCastling(unittest.TestCase):
         move = ChessCastle(self.board, 'e8', 'g8')
         with self.assertRaises(ChessCannotCastleIfRookHasMovedException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
 
     def test_king_has_moved_invalidates_castling(self):
         self.setup_king_rook_pair('light', kingside=False)
@@ -503,7 +663,6 @@ class TestCastling(unittest.TestCase):
         move = ChessCastle(self.board, 'e1', 'c1')
         with self.assertRaises(ChessCannotCastleIfKingHasMovedException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
 
     def test_king_is_in_check(self):
         self.setup_king_rook_pair('light', kingside=True)
@@ -511,7 +670,24 @@ class TestCastling(unittest.TestCase):
         move = ChessCastle(self.board, 'e1', 'g1')
         with self.assertRaises(ChessCannotCastleOutOfCheckException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
+
+    def test_in_check_is_reported_before_blockers(self):
+        self.setup_king_rook_pair('light', kingside=True)
+        self.board['e8'].place(Queen('dark'))  # Queen checks e1
+        self.board['f1'].place(Bishop('light'))
+        move = ChessCastle(self.board, 'e1', 'g1')
+        with self.assertRaises(ChessCannotCastleOutOfCheckException):
+            move.validate()
+
+    def test_lost_rights_are_reported_before_any_attack_lookup(self):
+        self.setup_king_rook_pair('light', kingside=True)
+        self.board['e8'].place(Queen('dark'))  # Queen checks e1, but the Rook has moved anyway
+        self.board['h1'].contains().raise_moved_flag()
+        move = ChessCastle(self.board, 'e1', 'g1')
+        with mock.patch.object(ChessBoard, 'attacked_squares') as attacked_squares:
+            with self.assertRaises(ChessCannotCastleIfRookHasMovedException):
+                move.validate_other_constraints()
+        attacked_squares.assert_not_called()
 
     def test_king_moves_through_check(self):
         self.setup_king_rook_pair('dark', kingside=True)
@@ -519,7 +695,6 @@ class TestCastling(unittest.TestCase):
         move = ChessCastle(self.board, 'e8', 'g8')
         with self.assertRaises(ChessCannotCastleIntoCheckException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
 
     def test_king_destination_square_under_attack(self):
         self.setup_king_rook_pair('dark', kingside=True)
@@ -527,14 +702,12 @@ class TestCastling(unittest.TestCase):
         move = ChessCastle(self.board, 'e8', 'g8')
         with self.assertRaises(ChessCannotCastleIntoCheckException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
 
     def test_invalid_target_square(self):
         self.setup_king_rook_pair('light', kingside=True)
         move = ChessCastle(self.board, 'e1', 'f1')  # Not a valid castle target
         with self.assertRaises(ChessCannotCastleIntoInvalidDestinationException):
             move.validate()
-        self.board.clear()  # Clear the board for next test
 
 #class TestDiscoveredChecks( unittest.TestCase ):
 #    def setUp( self ):
@@ -545,5 +718,56 @@ class TestCastling(unittest.TestCase):
 
 
 
+class TestNotation(unittest.TestCase):
+
+    def test_long_to_algebraic_forgets_least_recently_used(self):
+        board = ChessBoard()
+        board.setup()
+        converter = ChessNotationConverter( board )
+        with mock.patch.object( ChessNotationConverter, 'CACHE_SIZE', 2 ), \
+                mock.patch.object( ChessNotationConverter, '_algebraic_cache', OrderedDict() ) as cache:
+            for long_notation in ( 'e2e4', 'g1f3', 'e2e4', 'b1c3' ): # e2e4 gets used again...
+                converter.long_to_algebraic( long_notation )
+            # ...so it's g1f3 that made room for b1c3
+            self.assertEqual( [ cache_key[1] for cache_key in cache ], [ 'e2e4', 'b1c3' ] )
+
+    def test_algebraic_to_long_forgets_least_recently_used(self):
+        board = ChessBoard()
+        board.setup()
+        converter = ChessNotationConverter( board )
+        with mock.patch.object( ChessNotationConverter, 'CACHE_SIZE', 2 ), \
+                mock.patch.object( ChessNotationConverter, '_long_cache', OrderedDict() ) as cache:
+            for algebraic in ( 'e4', 'Nf3', 'e4', 'Nc3' ):
+                converter.algebraic_to_long( algebraic )
+            self.assertEqual( [ cache_key[1] for cache_key in cache ], [ 'e4', 'Nc3' ] )
+
+    def test_algebraic_to_long_knows_which_pawns_moved(self):
+        # Same position, so the same hash, but only one of these Pawns may still step two squares
+        fresh, moved = ChessBoard(), ChessBoard()
+        for board in ( fresh, moved ):
+            board.clear()
+            board['e1'].place( King( 'light' ) )
+            board['e8'].place( King( 'dark' ) )
+            board['e4'].place( Pawn( 'light' ) )
+        moved['e4'].contains().raise_moved_flag()
+        self.assertEqual( hash( fresh ), hash( moved ) )
+        self.assertEqual( ChessNotationConverter( fresh ).algebraic_to_long( 'e6' ), 'e4e6' )
+        with self.assertRaises( ValueError ): # Not answered from the first board's conversion
+            ChessNotationConverter( moved ).algebraic_to_long( 'e6' )
+
+class TestMagics(unittest.TestCase):
+    def test_rook_attacks_stop_at_blockers(self):
+        # Rook on a1 with pieces on a4 and d1: a2-a4 up the file, b1-d1 along the rank
+        self.assertEqual( rook_attacks( 0, 1 << 24 | 1 << 3 ), 1 << 8 | 1 << 16 | 1 << 24 | 1 << 1 | 1 << 2 | 1 << 3 )
+
+    def test_bishop_attacks_empty_board(self):
+        # Bishop on d4 sees both long diagonals, minus its own square
+        self.assertEqual( bishop_attacks( 27, 0 ).bit_count(), 13 )
+
+    def test_queen_is_rook_plus_bishop(self):
+        occupancy = 0x0000_1200_0044_0000
+        for square in range( 64 ):
+            self.assertEqual( queen_attacks( square, occupancy ), rook_attacks( square, occupancy ) | bishop_attacks( square, occupancy ) )
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,18 @@
+"""Zobrist keys for hashing chess positions.
+
+Each feature of a position (a given piece on a given square, the side to move, an en passant
+square, a set of castling rights) gets its own random 64-bit number, and a position's hash is
+all of its features' numbers XORed together.  Since XOR undoes itself, moving a piece only
+means XORing out its old square and XORing in its new one, rather than rehashing the board.
+
+The generator is seeded so that the keys, and therefore hashes, are the same on every run."""
+import random
+
+_rng = random.Random( 0xC0FFEE )
+
+# ZOBRIST_PIECE_SQ[color * 6 + piece type][square], in the same order as ChessBoard.bb
+ZOBRIST_PIECE_SQ = tuple( tuple( _rng.getrandbits( 64 ) for _ in range( 64 ) ) for _ in range( 12 ) )
+ZOBRIST_SIDE = _rng.getrandbits( 64 ) # XORed in when it's dark's turn
+ZOBRIST_EP = tuple( _rng.getrandbits( 64 ) for _ in range( 64 ) ) # by square of the vulnerable Pawn
+# Castling rights as a four bit number: light kingside, light queenside, dark kingside, dark queenside
+ZOBRIST_CASTLE = tuple( _rng.getrandbits( 64 ) for _ in range( 16 ) )